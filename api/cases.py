@@ -1,13 +1,12 @@
 from fastapi import APIRouter, Depends, HTTPException, Path, Body, Request
+from fastapi.responses import ORJSONResponse, StreamingResponse
 from pydantic import BaseModel
-from typing import List, Optional
-import psycopg2
-import os
-from dotenv import load_dotenv
+from typing import Dict, List, Optional, Tuple
+from itertools import product
+import orjson
 from ratelimit import global_limit
-
-load_dotenv()
-DATABASE_CONNECTION_STRING = os.getenv("DATABASE_CONNECTION_STRING")
+from db import get_conn, execute_prepared, unique_tags
+from cache import CASES_LIST_KEY, get_cached, set_cached, invalidate_tags
 
 router = APIRouter()
 
@@ -16,6 +15,80 @@ def get_current_user():
     # Implement authentication logic here
     pass
 
+# Insert the case, upsert its tags and link them in a single round trip
+SQL_CREATE_CASE = """
+    WITH ins_case AS (
+        INSERT INTO "case" (name, description, defendant_id, plaintiff_id)
+        VALUES ($1, $2, $3, $4)
+        RETURNING id, state
+    ), ins_tags AS (
+        INSERT INTO tag (name)
+        SELECT unnest($5::text[])
+        ON CONFLICT (name) DO UPDATE SET name = EXCLUDED.name
+        RETURNING id, name
+    ), ins_case_tags AS (
+        INSERT INTO case_tag (case_id, tag_id)
+        SELECT ins_case.id, ins_tags.id FROM ins_case, ins_tags
+    )
+    SELECT id, state, COALESCE((SELECT array_agg(name) FROM ins_tags), '{}')
+    FROM ins_case
+"""
+
+# Fetch cases together with their tags in a single round trip
+SQL_LIST_CASES = """
+    SELECT c.id, c.name, c.description, c.defendant_id, c.plaintiff_id, c.state,
+           COALESCE(array_agg(t.name) FILTER (WHERE t.name IS NOT NULL), '{}') AS tags
+    FROM "case" c
+    LEFT JOIN case_tag ct ON ct.case_id = c.id
+    LEFT JOIN tag t ON t.id = ct.tag_id
+    GROUP BY c.id
+    ORDER BY c.id
+"""
+
+# Add missing tag links and drop stale ones in one round trip; returns the number of changed links
+SQL_UPDATE_CASE_TAGS = """
+    WITH want AS (
+        SELECT unnest($2::text[]) AS name
+    ), want_ids AS (
+        INSERT INTO tag (name) SELECT name FROM want
+        ON CONFLICT (name) DO UPDATE SET name = EXCLUDED.name
+        RETURNING id
+    ), added AS (
+        INSERT INTO case_tag (case_id, tag_id)
+        SELECT $1, id FROM want_ids
+        ON CONFLICT DO NOTHING
+        RETURNING tag_id
+    ), removed AS (
+        DELETE FROM case_tag
+        WHERE case_id = $1 AND tag_id NOT IN (SELECT id FROM want_ids)
+        RETURNING tag_id
+    )
+    SELECT (SELECT count(*) FROM added) + (SELECT count(*) FROM removed)
+"""
+
+SQL_GET_CASE = 'SELECT id, name, description, defendant_id, plaintiff_id, state FROM "case" WHERE id = $1'
+
+SQL_TAGS_FOR_CASE = 'SELECT name FROM tag JOIN case_tag ON tag.id = case_tag.tag_id WHERE case_tag.case_id = $1'
+
+CASE_UPDATE_COLUMNS = ("name", "description", "state")
+
+def _case_update_statement(provided: Tuple[bool, ...]) -> Tuple[str, str]:
+    """
+    Build the (statement name, SQL) pair updating the provided columns of a case.
+    """
+    columns = [column for column, given in zip(CASE_UPDATE_COLUMNS, provided) if given]
+    assignments = ", ".join(f"{column} = ${i}" for i, column in enumerate(columns, start=2))
+    name = "update_case_" + "".join("1" if given else "0" for given in provided)
+    return name, f'UPDATE "case" SET {assignments} WHERE id = $1'
+
+# Every combination of provided fields is built once at import time, keyed by
+# which of CASE_UPDATE_COLUMNS are set
+SQL_UPDATE_CASE: Dict[Tuple[bool, ...], Tuple[str, str]] = {
+    provided: _case_update_statement(provided)
+    for provided in product((False, True), repeat=len(CASE_UPDATE_COLUMNS))
+    if any(provided)
+}
+
 class CaseCreateRequest(BaseModel):
     name: str
     description: Optional[str] = None
@@ -35,73 +108,69 @@ class CaseResponse(BaseModel):
 @router.post("/cases", response_model=CaseResponse)
 @global_limit
 def create_case(request: Request, case: CaseCreateRequest, user=Depends(get_current_user)):
-    try:
-        with psycopg2.connect(DATABASE_CONNECTION_STRING) as conn:
-            with conn.cursor() as cur:
-                # Set schema
-                cur.execute('SET SEARCH_PATH TO "schneider-poc";')
-                # Insert case
-                cur.execute(
-                    'INSERT INTO "case" (name, description, defendant_id, plaintiff_id) VALUES (%s, %s, %s, %s) RETURNING id;',
-                    (case.name, case.description, case.defendant_id, case.plaintiff_id)
-                )
-                case_id = cur.fetchone()[0]
-                tag_names = case.tags or []
-                tag_ids = []
-                for tag in tag_names:
-                    # Insert tag if not exists
-                    cur.execute('INSERT INTO tag (name) VALUES (%s) ON CONFLICT (name) DO UPDATE SET name=EXCLUDED.name RETURNING id;', (tag,))
-                    tag_id = cur.fetchone()[0]
-                    tag_ids.append(tag_id)
-                    # Associate tag with case
-                    cur.execute('INSERT INTO case_tag (case_id, tag_id) VALUES (%s, %s) ON CONFLICT DO NOTHING;', (case_id, tag_id))
-                conn.commit()
-                # Fetch tags for response
-                cur.execute('SELECT name FROM tag JOIN case_tag ON tag.id = case_tag.tag_id WHERE case_tag.case_id = %s;', (case_id,))
-                tags = [row[0] for row in cur.fetchall()]
-                return CaseResponse(
-                    id=case_id,
-                    name=case.name,
-                    description=case.description,
-                    defendant_id=case.defendant_id,
-                    plaintiff_id=case.plaintiff_id,
-                    tags=tags
-                )
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
+    with get_conn() as conn:
+        with conn.cursor() as cur:
+            execute_prepared(cur, "create_case", SQL_CREATE_CASE, (case.name, case.description, case.defendant_id, case.plaintiff_id, unique_tags(case.tags)))
+            case_id, state, tags = cur.fetchone()
+            conn.commit()
+            invalidate_tags("cases")
+            return CaseResponse(
+                id=case_id,
+                name=case.name,
+                description=case.description,
+                defendant_id=case.defendant_id,
+                plaintiff_id=case.plaintiff_id,
+                tags=tags,
+                state=state
+            )
 
 """
 Sample curl to list all cases:
 curl -X GET http://localhost:8000/cases
+
+Sample curl to stream all cases as NDJSON (one case per line):
+curl -X GET http://localhost:8000/cases -H "Accept: application/x-ndjson"
 """
 
-from typing import List
+def case_row_to_dict(row) -> dict:
+    return dict(
+        id=row[0],
+        name=row[1],
+        description=row[2],
+        defendant_id=row[3],
+        plaintiff_id=row[4],
+        tags=row[6],
+        state=row[5]
+    )
+
+def stream_cases_ndjson():
+    """
+    Yield all cases as NDJSON lines, reading them through a server-side cursor
+    so only one batch of rows is held in memory at a time.
+    """
+    with get_conn() as conn:
+        with conn.cursor(name="list_cases_stream") as cur:
+            cur.itersize = 1000
+            cur.execute(SQL_LIST_CASES)
+            for row in cur:
+                yield orjson.dumps(case_row_to_dict(row)) + b"\n"
 
 @router.get("/cases", response_model=List[CaseResponse])
 @global_limit
 def list_cases(request: Request, user=Depends(get_current_user)):
-    try:
-        with psycopg2.connect(DATABASE_CONNECTION_STRING) as conn:
-            with conn.cursor() as cur:
-                cur.execute('SET SEARCH_PATH TO "schneider-poc";')
-                cur.execute('SELECT id, name, description, defendant_id, plaintiff_id, state FROM "case";')
-                cases = cur.fetchall()
-                result = []
-                for row in cases:
-                    cur.execute('SELECT name FROM tag JOIN case_tag ON tag.id = case_tag.tag_id WHERE case_tag.case_id = %s;', (row[0],))
-                    tags = [tag_row[0] for tag_row in cur.fetchall()]
-                    result.append(CaseResponse(
-                        id=row[0],
-                        name=row[1],
-                        description=row[2],
-                        defendant_id=row[3],
-                        plaintiff_id=row[4],
-                        tags=tags,
-                        state=row[5]
-                    ))
-                return result
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
+    if "application/x-ndjson" in request.headers.get("accept", ""):
+        return StreamingResponse(stream_cases_ndjson(), media_type="application/x-ndjson")
+    cached = get_cached(CASES_LIST_KEY)
+    if cached is not None:
+        return ORJSONResponse(cached)
+    with get_conn() as conn:
+        with conn.cursor() as cur:
+            execute_prepared(cur, "list_cases", SQL_LIST_CASES)
+            result = [case_row_to_dict(row) for row in cur.fetchall()]
+    set_cached(CASES_LIST_KEY, result, tags=["cases", *(f"case:{c['id']}" for c in result)])
+    # Rows come straight from the database, so skip re-validating them against
+    # response_model (which still documents the schema)
+    return ORJSONResponse(result)
 
 class CaseUpdateRequest(BaseModel):
     name: Optional[str] = None
@@ -129,72 +198,35 @@ def update_case(
     update: CaseUpdateRequest = Body(...),
     user=Depends(get_current_user)
 ):
-    try:
-        with psycopg2.connect(DATABASE_CONNECTION_STRING) as conn:
-            with conn.cursor() as cur:
-                cur.execute('SET SEARCH_PATH TO "schneider-poc";')
-                # Build dynamic update query
-                fields = []
-                values = []
-                if update.name is not None:
-                    fields.append('name = %s')
-                    values.append(update.name)
-                if update.description is not None:
-                    fields.append('description = %s')
-                    values.append(update.description)
-                if update.state is not None:
-                    fields.append('state = %s')
-                    values.append(update.state)
-                if fields:
-                    query = f'UPDATE "case" SET {", ".join(fields)} WHERE id = %s'
-                    values.append(case_id)
-                    cur.execute(query, tuple(values))
-                # Update tags if provided
-                if update.tags is not None:
-                    # Remove existing tags for this case
-                    cur.execute('DELETE FROM case_tag WHERE case_id = %s;', (case_id,))
-                    for tag in update.tags:
-                        cur.execute('INSERT INTO tag (name) VALUES (%s) ON CONFLICT (name) DO UPDATE SET name=EXCLUDED.name RETURNING id;', (tag,))
-                        tag_id = cur.fetchone()[0]
-                        cur.execute('INSERT INTO case_tag (case_id, tag_id) VALUES (%s, %s) ON CONFLICT DO NOTHING;', (case_id, tag_id))
-                conn.commit()
-                # Fetch updated case
-                cur.execute('SELECT id, name, description, defendant_id, plaintiff_id, state FROM "case" WHERE id = %s;', (case_id,))
-                row = cur.fetchone()
-                if not row:
-                    raise HTTPException(status_code=404, detail="Case not found")
-                cur.execute('SELECT name FROM tag JOIN case_tag ON tag.id = case_tag.tag_id WHERE case_tag.case_id = %s;', (case_id,))
-                tags = [tag_row[0] for tag_row in cur.fetchall()]
-                return CaseResponse(
-                    id=row[0],
-                    name=row[1],
-                    description=row[2],
-                    defendant_id=row[3],
-                    plaintiff_id=row[4],
-                    tags=tags,
-                    state=row[5]
-                )
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
-
-class PersonCreateRequest(BaseModel):
-    name: str
-    lastname: str
-    contact_info: Optional[str] = None
-    legal_representative_id: Optional[int] = None
-    role: str  # 'plaintiff' or 'defendant'
-
-class PersonResponse(BaseModel):
-    id: int
-    name: str
-    lastname: str
-    contact_info: Optional[str]
-    legal_representative_id: Optional[int]
-    role: str
-
-class DocumentResponse(BaseModel):
-    id: int
-    case_id: int
-    file_path: str
-    upload_timestamp: str
-    tags: list[str] 
\ No newline at end of file
+    with get_conn() as conn:
+        with conn.cursor() as cur:
+            values = (update.name, update.description, update.state)
+            provided = tuple(value is not None for value in values)
+            changed = any(provided)
+            if changed:
+                statement_name, sql = SQL_UPDATE_CASE[provided]
+                execute_prepared(cur, statement_name, sql, (case_id, *(value for value in values if value is not None)))
+            # Update tags if provided: add missing links and drop stale ones in one round trip
+            if update.tags is not None:
+                execute_prepared(cur, "update_case_tags", SQL_UPDATE_CASE_TAGS, (case_id, unique_tags(update.tags)))
+                changed = changed or cur.fetchone()[0] > 0
+            conn.commit()
+            # Unchanged tags leave cached entries valid
+            if changed:
+                invalidate_tags(f"case:{case_id}")
+            # Fetch updated case
+            execute_prepared(cur, "get_case", SQL_GET_CASE, (case_id,))
+            row = cur.fetchone()
+            if not row:
+                raise HTTPException(status_code=404, detail="Case not found")
+            execute_prepared(cur, "get_case_tags", SQL_TAGS_FOR_CASE, (case_id,))
+            tags = [tag_row[0] for tag_row in cur.fetchall()]
+            return CaseResponse(
+                id=row[0],
+                name=row[1],
+                description=row[2],
+                defendant_id=row[3],
+                plaintiff_id=row[4],
+                tags=tags,
+                state=row[5]
+            )
@@ -3,25 +3,31 @@ Sample curl to list all documents for a case:
 curl -X GET http://localhost:8000/cases/1/documents
 """
 
-from fastapi import APIRouter, Depends, HTTPException, Path, Body, UploadFile, File, Query, Request
+from fastapi import APIRouter, BackgroundTasks, Depends, HTTPException, Path, Body, UploadFile, File, Query, Request
+from fastapi.responses import ORJSONResponse, StreamingResponse
 from pydantic import BaseModel
-from typing import List, Optional
-import psycopg2
+from typing import List, Optional, Tuple
+import io
+import logging
+import orjson
 import os
-from dotenv import load_dotenv
 import shutil
-from rag.rag_engine import RAGEngine
 import datetime
 from rag.doc_loader import load_docx_as_documents
 from rag.semantic_chunker import semantic_chunk_documents
 from rag.qdrant_uploader import upload_nodes_to_qdrant
 from rag.embedder import embed_nodes
+from rag.semantic_cache import invalidate_case
+from rag.summarizer import summarize_document
+from settings import SUMMARY_AUGMENTED_CHUNKING
 from ratelimit import global_limit
+from db import get_conn, execute_prepared, unique_tags, bulk_insert_tags, lookup_tag_ids, remember_tag_ids
+from cache import case_documents_key, get_cached, set_cached, invalidate_tags
 import re
+from concurrent.futures import ThreadPoolExecutor
 from rag.crewai_legal_agent import answer_legal_question
 
-load_dotenv()
-DATABASE_CONNECTION_STRING = os.getenv("DATABASE_CONNECTION_STRING")
+logger = logging.getLogger(__name__)
 
 router = APIRouter()
 
@@ -33,15 +39,57 @@ class DocumentResponse(BaseModel):
     id: int
     case_id: int
     file_path: str
-    upload_timestamp: str
+    upload_timestamp: datetime.datetime
     tags: List[str]
+    status: Optional[str] = None  # "pending" while an upload is still being indexed
+
+# Documents are fetched together with their tags in a single round trip
+SQL_DOCUMENTS_WITH_TAGS = """
+    SELECT d.id, d.case_id, d.file_path, d.upload_timestamp,
+           COALESCE(array_agg(t.name) FILTER (WHERE t.name IS NOT NULL), '{}') AS tags
+    FROM document d
+    LEFT JOIN document_tag dt ON dt.document_id = d.id
+    LEFT JOIN tag t ON t.id = dt.tag_id
+"""
+
+SQL_LIST_CASE_DOCUMENTS = SQL_DOCUMENTS_WITH_TAGS + "WHERE d.case_id = $1 GROUP BY d.id ORDER BY d.id"
+
+SQL_GET_DOCUMENT = SQL_DOCUMENTS_WITH_TAGS + "WHERE d.id = $1 GROUP BY d.id"
+
+# Add missing tag links and drop stale ones in one round trip; returns the number of changed links
+SQL_SET_DOCUMENT_TAGS = """
+    WITH want AS (
+        SELECT unnest($2::int[]) AS id
+    ), added AS (
+        INSERT INTO document_tag (document_id, tag_id)
+        SELECT $1, id FROM want
+        WHERE EXISTS (SELECT 1 FROM document WHERE id = $1)
+        ON CONFLICT DO NOTHING
+        RETURNING tag_id
+    ), removed AS (
+        DELETE FROM document_tag
+        WHERE document_id = $1 AND tag_id NOT IN (SELECT id FROM want)
+        RETURNING tag_id
+    )
+    SELECT (SELECT count(*) FROM added) + (SELECT count(*) FROM removed)
+"""
+
+def document_row_to_dict(row) -> dict:
+    return dict(
+        id=row[0],
+        case_id=row[1],
+        file_path=row[2],
+        upload_timestamp=row[3],
+        tags=row[4]
+    )
 
 class DocumentTagsUpdateRequest(BaseModel):
     tags: list[str]
 
 class QueryRequest(BaseModel):
-    query: str
+    query: Optional[str] = None
     case_id: Optional[int] = None
+    point_id: Optional[str] = None  # Find chunks similar to this stored chunk instead of answering a query
 
 class CitationResponse(BaseModel):
     source: str
@@ -64,6 +112,22 @@ curl -X POST http://localhost:8000/query \
     "query": "What are the main legal arguments in this case?",
     "case_id": 1
   }'
+
+Sample curl to stream the answer as server-sent events while it is generated:
+curl -N -X POST http://localhost:8000/query/stream \
+  -H "Content-Type: application/json" \
+  -d '{
+    "query": "What are the main legal arguments in this case?",
+    "case_id": 1
+  }'
+
+Sample curl to find chunks similar to a stored chunk (Qdrant point ID):
+curl -X POST http://localhost:8000/query \
+  -H "Content-Type: application/json" \
+  -d '{
+    "point_id": "6f1c2d3e-0000-4000-8000-000000000000",
+    "case_id": 1
+  }'
 """
 
 """
@@ -83,145 +147,199 @@ curl -X POST http://localhost:8000/documents/upload \
   -F "case_id=1"
 """
 
-def insert_document_fulltext(document_id: int, fulltext: str):
+def insert_documents(case_id: int, files: List[Tuple[str, str, datetime.datetime]]) -> List[Tuple[int, datetime.datetime]]:
     """
-    Insert the fulltext for a document into the document_fulltext table in 'poc-schneider' schema.
+    Insert document rows and their fulltext (document_fulltext table in 'poc-schneider' schema)
+    for a batch of uploaded files, using one connection and one transaction.
+
+    Args:
+        case_id: Case the documents belong to
+        files: (file_path, fulltext, upload_timestamp) tuples, one per file
+
+    Returns:
+        (id, upload_timestamp) tuples in the same order as files
     """
-    try:
-        with psycopg2.connect(DATABASE_CONNECTION_STRING) as conn:
-            with conn.cursor() as cur:
-                cur.execute('SET SEARCH_PATH TO "poc-schneider";')
-                cur.execute(
-                    'INSERT INTO document_fulltext (document_id, fulltext) VALUES (%s, %s);',
-                    (document_id, fulltext)
-                )
-                conn.commit()
-    except Exception as e:
-        print(f"Error inserting document fulltext: {e}")
-        raise
+    file_paths, fulltexts, timestamps = (list(column) for column in zip(*files))
+    with get_conn() as conn:
+        with conn.cursor() as cur:
+            # INSERT ... RETURNING does not guarantee rows come back in input order,
+            # so the ids are drawn first and every row is inserted with its own id
+            cur.execute(
+                "SELECT nextval(pg_get_serial_sequence('document', 'id')) FROM generate_series(1, %s);",
+                (len(files),)
+            )
+            ids = [row[0] for row in cur.fetchall()]
+            cur.execute(
+                'INSERT INTO document (id, case_id, file_path, upload_timestamp) '
+                'SELECT u.id, %s, u.file_path, u.upload_timestamp '
+                'FROM unnest(%s::int[], %s::text[], %s::timestamptz[]) AS u(id, file_path, upload_timestamp) '
+                'RETURNING id, upload_timestamp;',
+                (case_id, ids, file_paths, timestamps)
+            )
+            upload_timestamps = dict(cur.fetchall())
+            # Schema-qualified: pooled connections use DB_SCHEMA as their search_path
+            cur.execute(
+                'INSERT INTO "poc-schneider".document_fulltext (document_id, fulltext) '
+                'SELECT * FROM unnest(%s::int[], %s::text[]);',
+                (ids, fulltexts)
+            )
+            conn.commit()
+    return [(doc_id, upload_timestamps[doc_id]) for doc_id in ids]
 
 @router.get("/cases/{case_id}/documents", response_model=List[DocumentResponse])
 @global_limit
 def list_case_documents(request: Request, case_id: int = Path(..., description="ID of the case"), user=Depends(get_current_user)):
-    try:
-        with psycopg2.connect(DATABASE_CONNECTION_STRING) as conn:
-            with conn.cursor() as cur:
-                cur.execute('SET SEARCH_PATH TO "schneider-poc";')
-                cur.execute('SELECT id, case_id, file_path, upload_timestamp FROM document WHERE case_id = %s;', (case_id,))
-                docs = cur.fetchall()
-                result = []
-                for row in docs:
-                    cur.execute('SELECT name FROM tag JOIN document_tag ON tag.id = document_tag.tag_id WHERE document_tag.document_id = %s;', (row[0],))
-                    tags = [tag_row[0] for tag_row in cur.fetchall()]
-                    result.append(DocumentResponse(
-                        id=row[0],
-                        case_id=row[1],
-                        file_path=row[2],
-                        upload_timestamp=str(row[3]),
-                        tags=tags
-                    ))
-                return result
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
+    cache_key = case_documents_key(case_id)
+    cached = get_cached(cache_key)
+    if cached is not None:
+        return ORJSONResponse(cached)
+    with get_conn() as conn:
+        with conn.cursor() as cur:
+            execute_prepared(cur, "list_case_documents", SQL_LIST_CASE_DOCUMENTS, (case_id,))
+            result = [document_row_to_dict(row) for row in cur.fetchall()]
+    set_cached(cache_key, result, tags=[cache_key, *(f"document:{d['id']}" for d in result)])
+    # Rows come straight from the database, so skip re-validating them against
+    # response_model (which still documents the schema)
+    return ORJSONResponse(result)
 
 @router.patch("/documents/{document_id}/tags", response_model=DocumentResponse)
 @global_limit
 def update_document_tags(request: Request, document_id: int, update: DocumentTagsUpdateRequest = Body(...), user=Depends(get_current_user)):
+    with get_conn() as conn:
+        with conn.cursor() as cur:
+            # Known tags are resolved in-process; only new ones need an upsert
+            tag_ids, missing = lookup_tag_ids(cur, unique_tags(update.tags))
+            new_tags = bulk_insert_tags(cur, missing)
+            tag_ids += [tag_id for tag_id, _ in new_tags]
+            execute_prepared(cur, "set_document_tags", SQL_SET_DOCUMENT_TAGS, (document_id, tag_ids))
+            changed = cur.fetchone()[0] > 0
+            # Read the result back in the same transaction, so nothing is committed for
+            # a missing document (the pool rolls back the open transaction on return)
+            execute_prepared(cur, "get_document", SQL_GET_DOCUMENT, (document_id,))
+            row = cur.fetchone()
+            if not row:
+                raise HTTPException(status_code=404, detail="Document not found")
+            conn.commit()
+            remember_tag_ids(new_tags)
+            # Unchanged tags leave cached entries valid
+            if changed:
+                invalidate_tags(f"document:{document_id}")
+            return DocumentResponse(**document_row_to_dict(row))
+
+# Regex for YYYY-MM-DD, DD.MM.YYYY, MM/DD/YYYY
+DATE_PATTERNS = [
+    re.compile(r"(\d{4}-\d{2}-\d{2})"),         # 2023-12-31
+    re.compile(r"(\d{2}\.\d{2}\.\d{4})"),     # 31.12.2023
+    re.compile(r"(\d{2}/\d{2}/\d{4})")         # 12/31/2023
+]
+
+# Maximum number of uploaded files loaded and chunked in parallel
+UPLOAD_WORKERS = 4
+
+# Block size used when copying an upload into memory
+UPLOAD_READ_CHUNK_SIZE = 1 << 20
+
+def load_upload(upload: UploadFile) -> List:
+    """
+    Load one uploaded .docx file into LlamaIndex documents.
+    """
+    # Read the uploaded file into memory in large blocks; python-docx seeks around the
+    # zip archive, which would otherwise hit the spooled temp file on disk repeatedly
+    buffer = io.BytesIO()
+    upload.file.seek(0)
+    shutil.copyfileobj(upload.file, buffer, length=UPLOAD_READ_CHUNK_SIZE)
+    buffer.seek(0)
+    return load_docx_as_documents(file_obj=buffer)
+
+def chunk_upload(file_name: str, documents: List) -> List:
+    """
+    Semantically chunk one loaded file, tagging its nodes with the file name,
+    the document summary used for summary-augmented embeddings and, if one is
+    found in the text, the document date.
+
+    Returns:
+        Nodes for the file; they are not embedded yet
+    """
+    # Chunk the document
+    nodes = semantic_chunk_documents(documents)
+    # Try to extract a date from the document text
+    doc_text = documents[0].text if documents else ""
+    found_date = None
+    for pattern in DATE_PATTERNS:
+        match = pattern.search(doc_text)
+        if match:
+            found_date = match.group(1)
+            break
+    summary = summarize_document(doc_text) if SUMMARY_AUGMENTED_CHUNKING else None
+    # Add filename, summary and date metadata to all nodes
+    for node in nodes:
+        if not hasattr(node, 'metadata') or not isinstance(node.metadata, dict):
+            node.metadata = {}
+        node.metadata["file_name"] = file_name
+        if summary:
+            node.metadata["summary"] = summary
+        if found_date:
+            node.metadata["document_date"] = found_date
+    return nodes
+
+def index_uploads(loaded: List[Tuple[str, List]], case_id: int):
+    """
+    Chunk, embed and upload the loaded files of one upload request to Qdrant.
+    Runs as a background task after the response has been sent.
+
+    Args:
+        loaded: (file_name, documents) tuples, one per uploaded file
+        case_id: Case ID stored in each node's payload
+    """
     try:
-        with psycopg2.connect(DATABASE_CONNECTION_STRING) as conn:
-            with conn.cursor() as cur:
-                cur.execute('SET SEARCH_PATH TO "schneider-poc";')
-                # Remove existing tags for this document
-                cur.execute('DELETE FROM document_tag WHERE document_id = %s;', (document_id,))
-                for tag in update.tags:
-                    cur.execute('INSERT INTO tag (name) VALUES (%s) ON CONFLICT (name) DO UPDATE SET name=EXCLUDED.name RETURNING id;', (tag,))
-                    tag_id = cur.fetchone()[0]
-                    cur.execute('INSERT INTO document_tag (document_id, tag_id) VALUES (%s, %s) ON CONFLICT DO NOTHING;', (document_id, tag_id))
-                conn.commit()
-                # Fetch updated document
-                cur.execute('SELECT id, case_id, file_path, upload_timestamp FROM document WHERE id = %s;', (document_id,))
-                row = cur.fetchone()
-                if not row:
-                    raise HTTPException(status_code=404, detail="Document not found")
-                cur.execute('SELECT name FROM tag JOIN document_tag ON tag.id = document_tag.tag_id WHERE document_tag.document_id = %s;', (document_id,))
-                tags = [tag_row[0] for tag_row in cur.fetchall()]
-                return DocumentResponse(
-                    id=row[0],
-                    case_id=row[1],
-                    file_path=row[2],
-                    upload_timestamp=str(row[3]),
-                    tags=tags
-                )
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
+        # Chunk every file concurrently; chunking waits on the embedding API
+        with ThreadPoolExecutor(max_workers=min(len(loaded), UPLOAD_WORKERS)) as executor:
+            node_lists = list(executor.map(lambda item: chunk_upload(*item), loaded))
+        all_nodes = [node for nodes in node_lists for node in nodes]
+        # Embed the chunks of all files together
+        embed_nodes(all_nodes)
+        # Upload to Qdrant with case_id metadata
+        upload_nodes_to_qdrant(all_nodes, collection_name="law-test", case_id=case_id)
+        # Cached answers for the case may be missing the new documents
+        invalidate_case(case_id, "law-test")
+    except Exception:
+        logger.exception(f"Indexing failed for case {case_id} files {[name for name, _ in loaded]}")
 
 UPLOAD_DIR = "uploaded_docs"
 if not os.path.exists(UPLOAD_DIR):
     os.makedirs(UPLOAD_DIR)
 
-@router.post("/documents/upload", response_model=List[DocumentResponse])
+@router.post("/documents/upload", response_model=List[DocumentResponse], status_code=202)
 @global_limit
 def upload_document(
     request: Request,
+    background_tasks: BackgroundTasks,
     file: List[UploadFile] = File(...),
     case_id: int = File(...),
     user=Depends(get_current_user)
 ):
-    responses = []
-    try:
-        for upload in file:
-            # 1. Read the uploaded file in-memory and load document
-            documents = load_docx_as_documents(file_obj=upload.file)
-            # 2. Chunk the document
-            nodes = semantic_chunk_documents(documents)
-            # 2.5. Try to extract a date from the document text
-            doc_text = documents[0].text if documents else ""
-            # Regex for YYYY-MM-DD, DD.MM.YYYY, MM/DD/YYYY
-            date_patterns = [
-                r"(\d{4}-\d{2}-\d{2})",         # 2023-12-31
-                r"(\d{2}\.\d{2}\.\d{4})",     # 31.12.2023
-                r"(\d{2}/\d{2}/\d{4})"         # 12/31/2023
-            ]
-            found_date = None
-            for pattern in date_patterns:
-                match = re.search(pattern, doc_text)
-                if match:
-                    found_date = match.group(1)
-                    break
-            # 3. Add filename and date metadata to all nodes
-            for node in nodes:
-                if not hasattr(node, 'metadata') or not isinstance(node.metadata, dict):
-                    node.metadata = {}
-                node.metadata["file_name"] = upload.filename
-                if found_date:
-                    node.metadata["document_date"] = found_date
-            # 4. Embed the chunks
-            embed_nodes(nodes)
-            # 5. Upload to Qdrant with case_id metadata
-            upload_nodes_to_qdrant(nodes, collection_name="law-test", case_id=case_id)
-            # 6. Insert into DB (file_path can be original filename or blank)
-            with psycopg2.connect(DATABASE_CONNECTION_STRING) as conn:
-                with conn.cursor() as cur:
-                    cur.execute('SET SEARCH_PATH TO "schneider-poc";')
-                    cur.execute(
-                        'INSERT INTO document (case_id, file_path, upload_timestamp) VALUES (%s, %s, %s) RETURNING id, upload_timestamp;',
-                        (case_id, upload.filename, datetime.datetime.now())
-                    )
-                    doc_id, upload_timestamp = cur.fetchone()
-                    conn.commit()
-            # 7. Store fulltext in document_fulltext (poc-schneider schema)
-            fulltext = documents[0].text if documents else ""
-            insert_document_fulltext(doc_id, fulltext)
-            responses.append(DocumentResponse(
-                id=doc_id,
-                case_id=case_id,
-                file_path=upload.filename,
-                upload_timestamp=str(upload_timestamp),
-                tags=[]
-            ))
-        return responses
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
+    """
+    Store the uploaded documents and their fulltext, then index them for /query in
+    the background. The response is sent before indexing finishes, so documents
+    are returned with status "pending".
+    """
+    # 1. Load every file; the upload streams are closed once the response is sent
+    loaded = [(upload.filename, load_upload(upload)) for upload in file]
+    # 2. Insert documents and their fulltext (poc-schneider schema) in one batch
+    now = datetime.datetime.now()
+    files = [(file_name, documents[0].text if documents else "", now) for file_name, documents in loaded]
+    rows = insert_documents(case_id, files)
+    invalidate_tags(case_documents_key(case_id))
+    # 3. Chunk, embed and upload to Qdrant after responding
+    background_tasks.add_task(index_uploads, loaded, case_id)
+    return [DocumentResponse(
+        id=doc_id,
+        case_id=case_id,
+        file_path=file_path,
+        upload_timestamp=upload_timestamp,
+        tags=[],
+        status="pending"
+    ) for (doc_id, upload_timestamp), (file_path, _, _) in zip(rows, files)]
 
 @router.post("/query", response_model=QueryResponse)
 @global_limit
@@ -234,37 +352,77 @@ def query_documents(
     Query documents using AI-powered retrieval and generation.
     Searches through uploaded documents and provides AI-generated responses with citations.
     """
-    try:
-        # Initialize RAG engine
-        rag_engine = RAGEngine(collection_name="law-test")
+    # Shared RAG engine, built once at startup
+    rag_engine = request.app.state.rag
 
+    if query_request.query is not None:
         # Perform AI-powered query with citations
         result = rag_engine.query(
             query=query_request.query,
             case_id=query_request.case_id
         )
+    elif query_request.point_id is not None:
+        # Similarity search from a stored chunk, without generating an answer
+        result = rag_engine.find_similar(
+            point_id=query_request.point_id,
+            case_id=query_request.case_id
+        )
+    else:
+        raise HTTPException(status_code=400, detail="Either query or point_id must be provided.")
 
-        # Convert citations to response format
-        citations = [
-            CitationResponse(
-                source=citation["source"],
-                text=citation["text"],
-                case_id=citation.get("case_id"),
-                score=citation.get("score")
-            )
-            for citation in result.get("citations", [])
-        ]
-
-        return QueryResponse(
-            answer=result.get("answer", ""),
-            citations=citations,
-            retrieved_chunks=result.get("retrieved_chunks", 0),
-            case_id_filter=result.get("case_id_filter"),
-            error=result.get("error")
+    # Convert citations to response format
+    citations = [
+        CitationResponse(
+            source=citation["source"],
+            text=citation["text"],
+            case_id=citation.get("case_id"),
+            score=citation.get("score")
         )
+        for citation in result.get("citations", [])
+    ]
 
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
+    return QueryResponse(
+        answer=result.get("answer", ""),
+        citations=citations,
+        retrieved_chunks=result.get("retrieved_chunks", 0),
+        case_id_filter=result.get("case_id_filter"),
+        error=result.get("error")
+    )
+
+def stream_query_events(rag_engine, query: str, case_id: Optional[int]):
+    """
+    Yield RAGEngine.query_stream events as server-sent events: "citations" first,
+    then one "chunk" per piece of the answer, then "complete" with the full result.
+    """
+    try:
+        for event_type, data in rag_engine.query_stream(query=query, case_id=case_id):
+            yield b"event: " + event_type.encode() + b"\ndata: " + orjson.dumps(data) + b"\n\n"
+    except Exception:
+        # The response has already started, so report the failure in the stream
+        logger.exception(f"Streaming query failed: {query}")
+        # Fixed message, like the app-level handlers: the exception text can hold
+        # hosts, SQL or key fragments
+        yield b"event: error\ndata: " + orjson.dumps({"detail": "query failed"}) + b"\n\n"
+
+@router.post("/query/stream")
+@global_limit
+def query_documents_stream(
+    request: Request,
+    query_request: QueryRequest = Body(...),
+    user=Depends(get_current_user)
+):
+    """
+    Like /query, but streams the answer as server-sent events while the LLM
+    generates it, so the client sees the first words after retrieval instead
+    of after the whole answer.
+    """
+    if query_request.query is None:
+        raise HTTPException(status_code=400, detail="query must be provided.")
+    return StreamingResponse(
+        stream_query_events(request.app.state.rag, query_request.query, query_request.case_id),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
 
 @router.post("/query/agent", response_model=QueryResponse)
 @global_limit
@@ -277,28 +435,27 @@ def query_documents_agent(
     Query documents using the CrewAI agent (with RAG and context tools).
     Compatible with the /query endpoint.
     """
-    try:
-        # Use the CrewAI agent to answer the question
-        result = answer_legal_question(
-            question=query_request.query,
-            case_id=query_request.case_id
-        )
-        # Convert citations to response format (if present)
-        citations = [
-            CitationResponse(
-                source=citation.get("source", ""),
-                text=citation.get("text", ""),
-                case_id=citation.get("case_id"),
-                score=citation.get("score")
-            )
-            for citation in result.get("citations", [])
-        ]
-        return QueryResponse(
-            answer=result.get("answer", ""),
-            citations=citations,
-            retrieved_chunks=result.get("retrieved_chunks", 0),
-            case_id_filter=result.get("case_id_filter"),
-            error=result.get("error")
+    if query_request.query is None:
+        raise HTTPException(status_code=400, detail="query must be provided.")
+    # Use the CrewAI agent to answer the question
+    result = answer_legal_question(
+        question=query_request.query,
+        case_id=query_request.case_id
+    )
+    # Convert citations to response format (if present)
+    citations = [
+        CitationResponse(
+            source=citation.get("source", ""),
+            text=citation.get("text", ""),
+            case_id=citation.get("case_id"),
+            score=citation.get("score")
         )
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e)) 
\ No newline at end of file
+        for citation in result.get("citations", [])
+    ]
+    return QueryResponse(
+        answer=result.get("answer", ""),
+        citations=citations,
+        retrieved_chunks=result.get("retrieved_chunks", 0),
+        case_id_filter=result.get("case_id_filter"),
+        error=result.get("error")
+    )
\ No newline at end of file
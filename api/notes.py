@@ -12,16 +12,13 @@ curl -X POST http://localhost:8000/cases/1/notes \
 """
 
 from fastapi import APIRouter, Depends, HTTPException, Path, Request
+from fastapi.responses import ORJSONResponse
 from pydantic import BaseModel
 from typing import List, Optional
-import psycopg2
-import os
-from dotenv import load_dotenv
 from datetime import datetime
 from ratelimit import global_limit
-
-load_dotenv()
-DATABASE_CONNECTION_STRING = os.getenv("DATABASE_CONNECTION_STRING")
+from db import get_conn, execute_prepared
+from cache import case_notes_key, get_cached, set_cached, invalidate_tags
 
 router = APIRouter()
 
@@ -34,50 +31,51 @@ class NoteResponse(BaseModel):
     case_id: int
     author_id: int
     note_content: str
-    timestamp: str
+    timestamp: datetime
 
 class NoteCreateRequest(BaseModel):
     author_id: int
     note_content: str
 
+SQL_LIST_CASE_NOTES = 'SELECT id, case_id, author_id, note_content, timestamp FROM note WHERE case_id = $1 ORDER BY timestamp ASC'
+
+SQL_CREATE_NOTE = 'INSERT INTO note (case_id, author_id, note_content, timestamp) VALUES ($1, $2, $3, $4) RETURNING id, timestamp'
+
 @router.get("/cases/{case_id}/notes", response_model=List[NoteResponse])
 @global_limit
 def list_case_notes(request: Request, case_id: int = Path(..., description="ID of the case"), user=Depends(get_current_user)):
-    try:
-        with psycopg2.connect(DATABASE_CONNECTION_STRING) as conn:
-            with conn.cursor() as cur:
-                cur.execute('SET SEARCH_PATH TO "schneider-poc";')
-                cur.execute('SELECT id, case_id, author_id, note_content, timestamp FROM note WHERE case_id = %s ORDER BY timestamp ASC;', (case_id,))
-                notes = cur.fetchall()
-                return [NoteResponse(
-                    id=row[0],
-                    case_id=row[1],
-                    author_id=row[2],
-                    note_content=row[3],
-                    timestamp=str(row[4])
-                ) for row in notes]
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
+    cache_key = case_notes_key(case_id)
+    cached = get_cached(cache_key)
+    if cached is not None:
+        return ORJSONResponse(cached)
+    with get_conn() as conn:
+        with conn.cursor() as cur:
+            execute_prepared(cur, "list_case_notes", SQL_LIST_CASE_NOTES, (case_id,))
+            result = [dict(
+                id=row[0],
+                case_id=row[1],
+                author_id=row[2],
+                note_content=row[3],
+                timestamp=row[4]
+            ) for row in cur.fetchall()]
+    set_cached(cache_key, result, tags=[cache_key])
+    # Rows come straight from the database, so skip re-validating them against
+    # response_model (which still documents the schema)
+    return ORJSONResponse(result)
 
 @router.post("/cases/{case_id}/notes", response_model=NoteResponse)
 @global_limit
 def create_case_note(request: Request, case_id: int, note: NoteCreateRequest, user=Depends(get_current_user)):
-    try:
-        with psycopg2.connect(DATABASE_CONNECTION_STRING) as conn:
-            with conn.cursor() as cur:
-                cur.execute('SET SEARCH_PATH TO "schneider-poc";')
-                cur.execute(
-                    'INSERT INTO note (case_id, author_id, note_content, timestamp) VALUES (%s, %s, %s, %s) RETURNING id, timestamp;',
-                    (case_id, note.author_id, note.note_content, datetime.now())
-                )
-                note_id, timestamp = cur.fetchone()
-                conn.commit()
-                return NoteResponse(
-                    id=note_id,
-                    case_id=case_id,
-                    author_id=note.author_id,
-                    note_content=note.note_content,
-                    timestamp=str(timestamp)
-                )
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e)) 
\ No newline at end of file
+    with get_conn() as conn:
+        with conn.cursor() as cur:
+            execute_prepared(cur, "create_note", SQL_CREATE_NOTE, (case_id, note.author_id, note.note_content, datetime.now()))
+            note_id, timestamp = cur.fetchone()
+            conn.commit()
+            invalidate_tags(case_notes_key(case_id))
+            return NoteResponse(
+                id=note_id,
+                case_id=case_id,
+                author_id=note.author_id,
+                note_content=note.note_content,
+                timestamp=timestamp
+            )
\ No newline at end of file
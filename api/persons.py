@@ -10,15 +10,11 @@ curl -X POST http://localhost:8000/persons \
 """
 
 from fastapi import APIRouter, Depends, HTTPException, Request
+from fastapi.responses import ORJSONResponse
 from pydantic import BaseModel
 from typing import Optional, List
-import psycopg2
-import os
-from dotenv import load_dotenv
 from ratelimit import global_limit
-
-load_dotenv()
-DATABASE_CONNECTION_STRING = os.getenv("DATABASE_CONNECTION_STRING")
+from db import get_conn, execute_prepared
 
 router = APIRouter()
 
@@ -41,31 +37,34 @@ class PersonResponse(BaseModel):
     legal_representative_id: Optional[int]
     role: str
 
+SQL_CREATE_PERSON = """
+    INSERT INTO person (name, lastname, contact_info, legal_representative_id, role)
+    VALUES ($1, $2, $3, $4, $5)
+    RETURNING id, name, lastname, contact_info, legal_representative_id, role
+"""
+
+# Persons without a role (e.g. legal representatives) are returned with an empty string
+SQL_LIST_PERSONS = "SELECT id, name, lastname, contact_info, legal_representative_id, COALESCE(role, '') FROM person"
+
 @router.post("/persons", response_model=PersonResponse)
 @global_limit
 def create_person(request: Request, person: PersonCreateRequest, user=Depends(get_current_user)):
     if person.role not in ("plaintiff", "defendant"):
         raise HTTPException(status_code=400, detail="Role must be 'plaintiff' or 'defendant'.")
-    try:
-        with psycopg2.connect(DATABASE_CONNECTION_STRING) as conn:
-            with conn.cursor() as cur:
-                cur.execute('SET SEARCH_PATH TO "schneider-poc";')
-                cur.execute(
-                    'INSERT INTO person (name, contact_info, legal_representative_id) VALUES (%s, %s, %s) RETURNING id;',
-                    (f"{person.name} {person.lastname}", person.contact_info, person.legal_representative_id)
-                )
-                person_id = cur.fetchone()[0]
-                conn.commit()
-                return PersonResponse(
-                    id=person_id,
-                    name=person.name,
-                    lastname=person.lastname,
-                    contact_info=person.contact_info,
-                    legal_representative_id=person.legal_representative_id,
-                    role=person.role
-                )
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
+    with get_conn() as conn:
+        with conn.cursor() as cur:
+            execute_prepared(cur, "create_person", SQL_CREATE_PERSON, (person.name, person.lastname, person.contact_info, person.legal_representative_id, person.role))
+            row = cur.fetchone()
+            conn.commit()
+            # Build the response from the stored row rather than the request
+            return PersonResponse(
+                id=row[0],
+                name=row[1],
+                lastname=row[2],
+                contact_info=row[3],
+                legal_representative_id=row[4],
+                role=row[5]
+            )
 
 """
 Sample curl to list all persons:
@@ -75,27 +74,17 @@ curl -X GET http://localhost:8000/persons
 @router.get("/persons", response_model=List[PersonResponse])
 @global_limit
 def list_persons(request: Request, user=Depends(get_current_user)):
-    try:
-        with psycopg2.connect(DATABASE_CONNECTION_STRING) as conn:
-            with conn.cursor() as cur:
-                cur.execute('SET SEARCH_PATH TO "schneider-poc";')
-                cur.execute('SELECT id, name, contact_info, legal_representative_id FROM person;')
-                persons = cur.fetchall()
-                result = []
-                for row in persons:
-                    # Split name into name and lastname (assumes last word is lastname)
-                    name_parts = row[1].rsplit(' ', 1)
-                    name = name_parts[0] if len(name_parts) > 1 else row[1]
-                    lastname = name_parts[1] if len(name_parts) > 1 else ''
-                    # Role is not stored, so return empty string
-                    result.append(PersonResponse(
-                        id=row[0],
-                        name=name,
-                        lastname=lastname,
-                        contact_info=row[2],
-                        legal_representative_id=row[3],
-                        role=""
-                    ))
-                return result
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e)) 
\ No newline at end of file
+    with get_conn() as conn:
+        with conn.cursor() as cur:
+            execute_prepared(cur, "list_persons", SQL_LIST_PERSONS)
+            result = [dict(
+                id=row[0],
+                name=row[1],
+                lastname=row[2],
+                contact_info=row[3],
+                legal_representative_id=row[4],
+                role=row[5]
+            ) for row in cur.fetchall()]
+    # Rows come straight from the database, so skip re-validating them against
+    # response_model (which still documents the schema)
+    return ORJSONResponse(result)
\ No newline at end of file
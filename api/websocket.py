@@ -4,17 +4,19 @@ WebSocket endpoints for real-time streaming of CrewAI agent thinking and respons
 
 from fastapi import APIRouter, WebSocket, WebSocketDisconnect, Depends, HTTPException
 from fastapi.responses import JSONResponse
-from typing import Dict, Any, Optional, List
-import json
+from pydantic import BaseModel, ValidationError
+from typing import Dict, Any, Optional, List, Union
 import asyncio
 import logging
+import time
 from datetime import datetime
 import uuid
-from dataclasses import asdict
+import orjson
+import ormsgpack
 
-from rag.crewai_legal_agent import create_streaming_agent
+from rag.crewai_legal_agent import get_legal_agent, capture_rag_results, rag_citations
 from rag.streaming_callback import StreamingCallback, StreamingEvent
-from rag.rag_engine import RAGEngine
+from settings import WS_SEND_QUEUE_SIZE, WS_BATCH_WINDOW_SECONDS
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
@@ -22,19 +24,90 @@ logger = logging.getLogger(__name__)
 
 router = APIRouter()
 
+# Wire formats a client can select by sending {"format": "..."}; JSON text frames are the default
+MESSAGE_FORMATS = ("json", "msgpack")
+
+def encode_message(data: Any, message_format: str = "json") -> Union[str, bytes]:
+    """
+    Serialize an outbound message (a StreamingEvent or a dict) as JSON text or
+    MessagePack bytes. Both encoders handle dataclasses directly, without
+    building an intermediate dict.
+    """
+    if message_format == "msgpack":
+        return ormsgpack.packb(data)
+    return orjson.dumps(data).decode()
+
+# Streaming events of these types are sent right away instead of waiting for a batch
+UNBATCHED_EVENT_TYPES = ("agent_execution_complete", "agent_execution_error")
+
+def encode_batch(messages: List[Union[str, bytes]]) -> Union[str, bytes]:
+    """
+    Join already encoded events into one {"type": "batch", "events": [...]} frame.
+    All messages must use the same format (all JSON text or all MessagePack bytes).
+    """
+    if isinstance(messages[0], str):
+        return '{"type":"batch","events":[' + ",".join(messages) + "]}"
+    # MessagePack: a two-entry map header, the keys and values, then an array
+    # header followed by the events, which are already packed
+    count = len(messages)
+    if count < 16:
+        array_header = bytes((0x90 | count,))
+    elif count < 1 << 16:
+        array_header = b"\xdc" + count.to_bytes(2, "big")
+    else:
+        array_header = b"\xdd" + count.to_bytes(4, "big")
+    return (
+        b"\x82" + ormsgpack.packb("type") + ormsgpack.packb("batch")
+        + ormsgpack.packb("events") + array_header + b"".join(messages)
+    )
+
+class ClientMessage(BaseModel):
+    """Fields read from a client message; anything else in the message is ignored."""
+    query: Optional[str] = None
+    case_id: Optional[int] = None
+    stream_thinking: bool = True
+    format: Optional[str] = None
+
+def decode_message(raw: Dict[str, Any]) -> ClientMessage:
+    """
+    Decode and validate an inbound ASGI websocket.receive message: binary frames
+    are MessagePack, text frames are JSON. JSON is parsed straight into the model
+    by pydantic, without building an intermediate dict.
+
+    Raises:
+        ValidationError: If the frame is not valid JSON or the fields have the wrong types
+        MsgpackDecodeError: If a binary frame is not valid MessagePack
+    """
+    if raw.get("bytes") is not None:
+        return ClientMessage.model_validate(ormsgpack.unpackb(raw["bytes"]))
+    return ClientMessage.model_validate_json(raw["text"])
+
 # Connection management
 class ConnectionManager:
+    """
+    Tracks open WebSocket connections. Outgoing messages go through a bounded
+    queue per connection that a writer task drains, so producers (the agent's
+    streaming callback, broadcasts) never wait on a slow client's socket.
+    """
     def __init__(self):
         self.active_connections: Dict[str, WebSocket] = {}
         self.connection_metadata: Dict[str, Dict[str, Any]] = {}
+        self.send_queues: Dict[str, asyncio.Queue] = {}
+        self.writer_tasks: Dict[str, asyncio.Task] = {}
     
     async def connect(self, websocket: WebSocket, connection_id: str):
         await websocket.accept()
         self.active_connections[connection_id] = websocket
+        # Times are stored as epoch floats and only formatted for /ws/status
+        now = time.time()
         self.connection_metadata[connection_id] = {
-            "connected_at": datetime.now().isoformat(),
-            "last_activity": datetime.now().isoformat()
+            "connected_at": now,
+            "last_activity": now,
+            "format": "json"
         }
+        queue = asyncio.Queue(maxsize=WS_SEND_QUEUE_SIZE)
+        self.send_queues[connection_id] = queue
+        self.writer_tasks[connection_id] = asyncio.create_task(self._writer(connection_id, websocket, queue))
         logger.info(f"WebSocket connected: {connection_id}")
     
     def disconnect(self, connection_id: str):
@@ -42,36 +115,111 @@ class ConnectionManager:
             del self.active_connections[connection_id]
         if connection_id in self.connection_metadata:
             del self.connection_metadata[connection_id]
+        self.send_queues.pop(connection_id, None)
+        writer_task = self.writer_tasks.pop(connection_id, None)
+        if writer_task is not None and writer_task is not asyncio.current_task():
+            writer_task.cancel()
         logger.info(f"WebSocket disconnected: {connection_id}")
     
-    async def send_event(self, connection_id: str, event: StreamingEvent):
-        if connection_id in self.active_connections:
-            try:
-                websocket = self.active_connections[connection_id]
-                event_dict = asdict(event)
-                await websocket.send_text(json.dumps(event_dict))
-                self.connection_metadata[connection_id]["last_activity"] = datetime.now().isoformat()
-            except Exception as e:
-                logger.error(f"Error sending event to {connection_id}: {e}")
+    def set_format(self, connection_id: str, message_format: str):
+        if connection_id in self.connection_metadata:
+            self.connection_metadata[connection_id]["format"] = message_format
+    
+    async def _writer(self, connection_id: str, websocket: WebSocket, queue: asyncio.Queue):
+        """
+        Send queued messages to the client until the connection goes away.
+        Batchable events are held for WS_BATCH_WINDOW_SECONDS and sent together
+        with whatever else was queued meanwhile, so fast token streams cost one
+        frame per window instead of one per event.
+        """
+        pending = None
+        try:
+            while True:
+                if pending is not None:
+                    (message, batchable), pending = pending, None
+                else:
+                    message, batchable = await queue.get()
+                if batchable and WS_BATCH_WINDOW_SECONDS > 0:
+                    await asyncio.sleep(WS_BATCH_WINDOW_SECONDS)
+                    batch = [message]
+                    while not queue.empty():
+                        item = queue.get_nowait()
+                        # Keep order: stop at the first message that cannot join the batch
+                        if not item[1] or type(item[0]) is not type(message):
+                            pending = item
+                            break
+                        batch.append(item[0])
+                    if len(batch) > 1:
+                        message = encode_batch(batch)
+                if isinstance(message, bytes):
+                    await websocket.send_bytes(message)
+                else:
+                    await websocket.send_text(message)
+                metadata = self.connection_metadata.get(connection_id)
+                if metadata is not None:
+                    metadata["last_activity"] = time.time()
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.error(f"Error sending to {connection_id}: {e}")
+            self.disconnect(connection_id)
+    
+    def _enqueue(self, connection_id: str, message: Union[str, bytes], batchable: bool = False):
+        queue = self.send_queues.get(connection_id)
+        if queue is None:
+            return
+        # Rather than block the producer on a slow client, drop the oldest stream
+        # event; control messages and UNBATCHED_EVENT_TYPES are always delivered
+        if queue.full():
+            queued = [queue.get_nowait() for _ in range(queue.qsize())]
+            droppable = next((i for i, item in enumerate(queued) if item[1]), None)
+            if droppable is not None:
+                del queued[droppable]
+            for item in queued:
+                queue.put_nowait(item)
+            if droppable is not None:
+                logger.warning(f"Send queue full for {connection_id}, dropped oldest stream event")
+            elif batchable:
+                logger.warning(f"Send queue full for {connection_id}, dropped stream event")
+                return
+            else:
+                # Nothing left to drop: the client is too far behind to keep up
+                logger.warning(f"Send queue full of undroppable messages for {connection_id}, closing connection")
+                websocket = self.active_connections.get(connection_id)
                 self.disconnect(connection_id)
+                if websocket is not None:
+                    asyncio.create_task(websocket.close(code=1013))
+                return
+        queue.put_nowait((message, batchable))
+    
+    def _send(self, connection_id: str, data: Any, batchable: bool = False):
+        metadata = self.connection_metadata.get(connection_id)
+        if metadata is not None:
+            self._enqueue(connection_id, encode_message(data, metadata["format"]), batchable)
+    
+    async def send_event(self, connection_id: str, event: StreamingEvent):
+        self._send(connection_id, event, batchable=event.type not in UNBATCHED_EVENT_TYPES)
     
     async def send_json(self, connection_id: str, data: Dict[str, Any]):
-        if connection_id in self.active_connections:
-            try:
-                websocket = self.active_connections[connection_id]
-                await websocket.send_text(json.dumps(data))
-                self.connection_metadata[connection_id]["last_activity"] = datetime.now().isoformat()
-            except Exception as e:
-                logger.error(f"Error sending JSON to {connection_id}: {e}")
-                self.disconnect(connection_id)
+        self._send(connection_id, data)
+    
+    async def broadcast(self, data: Any) -> int:
+        """
+        Queue the same message for every connection. The payload is encoded once
+        per wire format instead of once per connection.
+        """
+        payloads = {message_format: encode_message(data, message_format) for message_format in MESSAGE_FORMATS}
+        connection_ids = list(self.active_connections.keys())
+        for connection_id in connection_ids:
+            self._enqueue(connection_id, payloads[self.connection_metadata[connection_id]["format"]])
+        return len(connection_ids)
     
     async def send_error(self, connection_id: str, error_message: str, error_type: str = "error"):
-        error_event = StreamingEvent(
-            type=error_type,
-            timestamp=datetime.now().timestamp(),
-            error=error_message
-        )
-        await self.send_event(connection_id, error_event)
+        await self.send_json(connection_id, {
+            "type": error_type,
+            "timestamp": time.time(),
+            "error": error_message
+        })
 
 # Global connection manager
 manager = ConnectionManager()
@@ -92,6 +240,10 @@ async def websocket_query(websocket: WebSocket):
         "case_id": 1,
         "stream_thinking": true
     }
+
+    Messages are JSON text frames by default. Send {"format": "msgpack"} (alone or
+    together with a query) to receive MessagePack binary frames from then on;
+    binary frames sent by the client are decoded as MessagePack.
     """
     connection_id = str(uuid.uuid4())
     
@@ -109,17 +261,34 @@ async def websocket_query(websocket: WebSocket):
         while True:
             # Receive message from client
             try:
-                data = await websocket.receive_text()
-                message = json.loads(data)
+                raw = await websocket.receive()
+                if raw["type"] == "websocket.disconnect":
+                    raise WebSocketDisconnect(raw.get("code", 1000))
+                message = decode_message(raw)
+                
+                # Switch the wire format for this connection if requested
+                if message.format is not None:
+                    message_format = message.format
+                    if message_format not in MESSAGE_FORMATS:
+                        await manager.send_error(connection_id, f"Unsupported format '{message_format}', expected one of {list(MESSAGE_FORMATS)}")
+                        continue
+                    manager.set_format(connection_id, message_format)
+                    await manager.send_json(connection_id, {
+                        "type": "format_set",
+                        "format": message_format,
+                        "timestamp": datetime.now().isoformat()
+                    })
+                    if message.query is None:
+                        continue
                 
                 # Validate message format
-                if "query" not in message:
+                if message.query is None:
                     await manager.send_error(connection_id, "Missing 'query' field in message")
                     continue
                 
-                query = message["query"]
-                case_id = message.get("case_id")
-                stream_thinking = message.get("stream_thinking", True)
+                query = message.query
+                case_id = message.case_id
+                stream_thinking = message.stream_thinking
                 
                 # Send query received confirmation
                 await manager.send_json(connection_id, {
@@ -129,9 +298,11 @@ async def websocket_query(websocket: WebSocket):
                     "timestamp": datetime.now().isoformat()
                 })
                 
-                # Create streaming callback
-                async def event_callback(event: StreamingEvent):
-                    await manager.send_event(connection_id, event)
+                # Create streaming callback. The agent runs in a worker thread, so
+                # events are handed back to this connection's event loop to be sent
+                loop = asyncio.get_running_loop()
+                def event_callback(event: StreamingEvent):
+                    asyncio.run_coroutine_threadsafe(manager.send_event(connection_id, event), loop)
                 
                 callback = StreamingCallback(event_callback=event_callback)
                 
@@ -145,8 +316,15 @@ async def websocket_query(websocket: WebSocket):
                     "message": "Ready for next query"
                 })
                 
-            except json.JSONDecodeError:
-                await manager.send_error(connection_id, "Invalid JSON format")
+            except ValidationError as e:
+                error = e.errors()[0]
+                if error["type"] == "json_invalid":
+                    await manager.send_error(connection_id, "Invalid JSON or MessagePack format")
+                else:
+                    location = ".".join(str(part) for part in error["loc"]) or "message"
+                    await manager.send_error(connection_id, f"Invalid message: {location}: {error['msg']}")
+            except ormsgpack.MsgpackDecodeError:
+                await manager.send_error(connection_id, "Invalid JSON or MessagePack format")
             except WebSocketDisconnect:
                 logger.info(f"WebSocket disconnected: {connection_id}")
                 break
@@ -175,28 +353,27 @@ async def run_agent_with_streaming(
         # Send agent start event
         start_event = StreamingEvent(
             type="agent_execution_start",
-            timestamp=datetime.now().timestamp(),
+            timestamp=time.time(),
             input_data={"query": query, "case_id": case_id}
         )
         await manager.send_event(connection_id, start_event)
         
-        # Create streaming agent
-        agent = create_streaming_agent(callbacks=[callback])
+        # Shared agent with this connection's streaming callback
+        agent = get_legal_agent(callbacks=[callback])
         
         # Prepare query
         full_query = query if case_id is None else f"[CASE {case_id}] {query}"
         
-        # Run agent
-        result = agent.kickoff(full_query)
-        
-        # Get RAG citations
-        rag_engine = RAGEngine(collection_name="law-test")
-        rag_result = rag_engine.query(query=query, case_id=case_id)
+        # Run the agent in a worker thread to keep the event loop serving other
+        # sockets; citations are taken from its RAG tool calls instead of a second query
+        rag_results = capture_rag_results()
+        result = await asyncio.to_thread(agent.kickoff, full_query)
+        rag_result = await asyncio.to_thread(rag_citations, rag_results, query, case_id)
         
         # Send final result
         final_event = StreamingEvent(
             type="agent_execution_complete",
-            timestamp=datetime.now().timestamp(),
+            timestamp=time.time(),
             output_data={
                 "answer": result.raw,
                 "citations": rag_result.get("citations", []),
@@ -210,7 +387,7 @@ async def run_agent_with_streaming(
         logger.error(f"Agent execution error: {e}")
         error_event = StreamingEvent(
             type="agent_execution_error",
-            timestamp=datetime.now().timestamp(),
+            timestamp=time.time(),
             error=str(e)
         )
         await manager.send_event(connection_id, error_event)
@@ -225,9 +402,13 @@ async def websocket_status():
         "connections": [
             {
                 "connection_id": conn_id,
-                "metadata": metadata
+                "metadata": {
+                    **metadata,
+                    "connected_at": datetime.fromtimestamp(metadata["connected_at"]).isoformat(),
+                    "last_activity": datetime.fromtimestamp(metadata["last_activity"]).isoformat()
+                }
             }
-            for conn_id, metadata in manager.connection_metadata.items()
+            for conn_id, metadata in list(manager.connection_metadata.items())
         ]
     }
 
@@ -238,11 +419,10 @@ async def broadcast_message(message: Dict[str, Any]):
     """
     broadcast_event = StreamingEvent(
         type="broadcast",
-        timestamp=datetime.now().timestamp(),
+        timestamp=time.time(),
         input_data=message
     )
     
-    for connection_id in list(manager.active_connections.keys()):
-        await manager.send_event(connection_id, broadcast_event)
+    sent = await manager.broadcast(broadcast_event)
     
-    return {"message": f"Broadcast sent to {len(manager.active_connections)} connections"} 
\ No newline at end of file
+    return {"message": f"Broadcast sent to {sent} connections"} 
\ No newline at end of file
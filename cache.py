@@ -0,0 +1,94 @@
+"""
+Redis-backed response cache for read-heavy list endpoints.
+
+Configure via environment variables (see settings.py):
+- REDIS_URL=redis://localhost:6379/0 (caching is disabled when unset)
+- CACHE_TTL_SECONDS=60 (optional, guards against missed invalidations)
+
+Entries are associated with tags (e.g. "case:42") through Redis sets, so a
+write only drops the entries that actually contain the changed rows. Run
+Redis with maxmemory-policy noeviction or volatile-lru so tag sets are not
+evicted ahead of the entries they point to.
+"""
+
+import logging
+from typing import Any, Iterable, Optional
+import orjson
+import redis
+from settings import REDIS_URL, CACHE_TTL_SECONDS
+
+logger = logging.getLogger(__name__)
+
+# Global client instance, created lazily on first use
+_client: Optional[redis.Redis] = None
+
+CASES_LIST_KEY = "cases:list"
+
+def case_documents_key(case_id: int) -> str:
+    return f"case:{case_id}:documents"
+
+def case_document_names_key(case_id: int) -> str:
+    return f"case:{case_id}:document_names"
+
+def case_notes_key(case_id: int) -> str:
+    return f"case:{case_id}:notes"
+
+def get_redis_client() -> Optional[redis.Redis]:
+    """
+    Get the shared Redis client, or None if caching is disabled.
+    """
+    global _client
+    if _client is None and REDIS_URL:
+        _client = redis.Redis.from_url(REDIS_URL)
+    return _client
+
+def get_cached(key: str) -> Optional[Any]:
+    """
+    Return the cached value for key, or None on a miss or if Redis is unavailable.
+    """
+    client = get_redis_client()
+    if client is None:
+        return None
+    try:
+        cached = client.get(key)
+    except redis.RedisError as e:
+        logger.warning(f"Cache read failed for {key}: {e}")
+        return None
+    return orjson.loads(cached) if cached is not None else None
+
+def _tag_key(tag: str) -> str:
+    return f"tag:{tag}"
+
+def set_cached(key: str, value: Any, tags: Iterable[str] = (), ttl: int = CACHE_TTL_SECONDS):
+    """
+    Store a JSON-serializable value under key with a TTL and register it under tags.
+    """
+    client = get_redis_client()
+    if client is None:
+        return
+    try:
+        pipe = client.pipeline()
+        pipe.set(key, orjson.dumps(value), ex=ttl)
+        for tag in tags:
+            pipe.sadd(_tag_key(tag), key)
+            pipe.expire(_tag_key(tag), ttl)
+        pipe.execute()
+    except redis.RedisError as e:
+        logger.warning(f"Cache write failed for {key}: {e}")
+
+def invalidate_tags(*tags: str):
+    """
+    Delete every cached entry registered under any of the given tags.
+    """
+    client = get_redis_client()
+    if client is None or not tags:
+        return
+    tag_keys = [_tag_key(tag) for tag in tags]
+    try:
+        pipe = client.pipeline()
+        for tag_key in tag_keys:
+            pipe.smembers(tag_key)
+        keys = set().union(*pipe.execute())
+        client.delete(*keys, *tag_keys)
+    except redis.RedisError as e:
+        logger.warning(f"Cache invalidation failed for tags {tags}: {e}")
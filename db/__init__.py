@@ -1 +1,193 @@
- 
\ No newline at end of file
+"""
+Shared PostgreSQL connection pool for the API routers.
+
+Connections are borrowed per request via get_conn() instead of opening a new
+connection (TCP + TLS + auth handshake) for every call.
+"""
+
+import threading
+from contextlib import contextmanager
+from typing import Dict, Iterable, List, Optional, Tuple
+import psycopg2
+import psycopg2.extensions
+from psycopg2.pool import ThreadedConnectionPool, PoolError
+from psycopg2.extras import execute_values
+from settings import (
+    DATABASE_CONNECTION_STRING,
+    DB_SCHEMA,
+    DB_POOL_MIN_CONN,
+    DB_POOL_MAX_CONN,
+    DB_POOL_TIMEOUT
+)
+
+# Global pool instance, created lazily on first use
+_pool: Optional[ThreadedConnectionPool] = None
+_pool_lock = threading.Lock()
+
+# ThreadedConnectionPool raises instead of waiting when it is exhausted. Sync
+# handlers run in FastAPI's threadpool (which is larger than the pool), so
+# callers queue on this semaphore until a connection is free.
+_pool_slots = threading.BoundedSemaphore(DB_POOL_MAX_CONN)
+
+class PreparingConnection(psycopg2.extensions.connection):
+    """
+    Connection that remembers which statements have been PREPAREd on it.
+
+    Prepared statements live for the whole session, so with pooled connections
+    each statement is parsed and planned once per connection instead of once
+    per request.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.prepared_statements = set()
+
+def get_pool() -> ThreadedConnectionPool:
+    """
+    Get the process-wide connection pool, creating it on first use.
+
+    Returns:
+        ThreadedConnectionPool: Pool shared by all request handlers
+    """
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = ThreadedConnectionPool(
+                    minconn=DB_POOL_MIN_CONN,
+                    maxconn=DB_POOL_MAX_CONN,
+                    dsn=DATABASE_CONNECTION_STRING,
+                    connection_factory=PreparingConnection,
+                    # Sent with the startup packet, so no per-request SET SEARCH_PATH is needed
+                    options=f'-c search_path="{DB_SCHEMA}"'
+                )
+    return _pool
+
+@contextmanager
+def get_conn():
+    """
+    Borrow a connection from the pool and return it when the block exits.
+
+    Any open transaction is rolled back by the pool on return, so callers still
+    need to call conn.commit() for writes. Connections that failed at the
+    network level are discarded instead of being handed out again.
+
+    Raises:
+        PoolError: If no connection becomes free within DB_POOL_TIMEOUT seconds
+    """
+    if not _pool_slots.acquire(timeout=DB_POOL_TIMEOUT):
+        raise PoolError(f"No database connection available after {DB_POOL_TIMEOUT}s")
+    try:
+        pool = get_pool()
+        conn = pool.getconn()
+        discard = False
+        try:
+            yield conn
+        except (psycopg2.OperationalError, psycopg2.InterfaceError):
+            discard = True
+            raise
+        finally:
+            pool.putconn(conn, close=discard or bool(conn.closed))
+    finally:
+        _pool_slots.release()
+
+def execute_prepared(cur, name: str, sql: str, params: tuple = ()):
+    """
+    Execute a server-side prepared statement, preparing it on first use.
+
+    Args:
+        cur: Cursor of a connection obtained from get_conn()
+        name: Statement name, unique per SQL text
+        sql: Statement text using $1, $2, ... placeholders
+        params: Values bound to the placeholders
+    """
+    conn = cur.connection
+    if name not in conn.prepared_statements:
+        cur.execute(f"PREPARE {name} AS {sql}")
+        conn.prepared_statements.add(name)
+    if params:
+        placeholders = ", ".join(["%s"] * len(params))
+        cur.execute(f"EXECUTE {name} ({placeholders})", params)
+    else:
+        cur.execute(f"EXECUTE {name}")
+
+def unique_tags(tags: Optional[List[str]]) -> List[str]:
+    """
+    Drop duplicate tag names (keeping order) before they are sent to Postgres.
+    ON CONFLICT DO UPDATE cannot touch the same tag row twice in one statement.
+    """
+    return list(dict.fromkeys(tags or []))
+
+def bulk_insert_tags(cur, names: List[str], page_size: int = 500) -> List[Tuple[int, str]]:
+    """
+    Upsert tag names with multi-row INSERTs instead of one statement per tag.
+
+    Args:
+        cur: Cursor of a connection obtained from get_conn()
+        names: Tag names to insert; duplicates are dropped before sending
+        page_size: Maximum number of rows sent per INSERT statement
+
+    Returns:
+        List of (id, name) tuples for all given tags
+    """
+    unique_names = unique_tags(names)
+    if not unique_names:
+        return []
+    return execute_values(
+        cur,
+        'INSERT INTO tag (name) VALUES %s ON CONFLICT (name) DO UPDATE SET name = EXCLUDED.name RETURNING id, name;',
+        [(name,) for name in unique_names],
+        page_size=page_size,
+        fetch=True
+    )
+
+# In-process tag name -> id cache. The tag vocabulary is small and tags are
+# never deleted by the API, so ids stay valid once they are committed.
+_tag_ids: Dict[str, int] = {}
+_tag_ids_loaded = False
+_tag_ids_lock = threading.Lock()
+
+def lookup_tag_ids(cur, names: List[str]) -> Tuple[List[int], List[str]]:
+    """
+    Resolve tag names to ids from the in-process cache, loading all tags on first use.
+
+    Args:
+        cur: Cursor of a connection obtained from get_conn()
+        names: Unique tag names to resolve
+
+    Returns:
+        (ids of cached tags, names not in the cache)
+    """
+    global _tag_ids_loaded
+    if not _tag_ids_loaded:
+        cur.execute('SELECT id, name FROM tag;')
+        remember_tag_ids(cur.fetchall())
+        _tag_ids_loaded = True
+    hits = []
+    misses = []
+    for name in names:
+        tag_id = _tag_ids.get(name)
+        if tag_id is None:
+            misses.append(name)
+        else:
+            hits.append(tag_id)
+    return hits, misses
+
+def remember_tag_ids(rows: Iterable[Tuple[int, str]]):
+    """
+    Add (id, name) rows to the tag cache. Only call this once the rows are
+    committed, so a rolled back insert never leaves a dangling id behind.
+    """
+    with _tag_ids_lock:
+        for tag_id, name in rows:
+            _tag_ids[name] = tag_id
+
+def close_pool():
+    """
+    Close all pooled connections. Useful on shutdown or for tests.
+    """
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.closeall()
+        _pool = None
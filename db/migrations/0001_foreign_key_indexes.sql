@@ -0,0 +1,21 @@
+-- Indexes for the foreign keys the API filters on.
+--
+-- case_tag and document_tag need no extra index for their case_id /
+-- document_id lookups: their primary keys (case_id, tag_id) and
+-- (document_id, tag_id) already lead with that column and contain tag_id,
+-- so the tag joins in list_cases and list_case_documents are index-only scans.
+--
+-- Apply with:
+--   psql "$DATABASE_CONNECTION_STRING" -f db/migrations/0001_foreign_key_indexes.sql
+
+SET search_path TO "schneider-poc";
+
+-- list_case_documents filters documents by case
+CREATE INDEX IF NOT EXISTS document_case_id_idx ON document (case_id);
+
+-- list_case_notes filters notes by case and orders them by timestamp
+CREATE INDEX IF NOT EXISTS note_case_id_timestamp_idx ON note (case_id, timestamp);
+
+-- Reverse lookups from a tag, also used by ON DELETE CASCADE when a tag is removed
+CREATE INDEX IF NOT EXISTS case_tag_tag_id_idx ON case_tag (tag_id);
+CREATE INDEX IF NOT EXISTS document_tag_tag_id_idx ON document_tag (tag_id);
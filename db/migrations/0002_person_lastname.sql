@@ -0,0 +1,16 @@
+-- Store a person's last name in its own column instead of appending it to name.
+--
+-- Existing rows are split at the last space, matching how list_persons used
+-- to split them on read.
+--
+-- Apply with:
+--   psql "$DATABASE_CONNECTION_STRING" -f db/migrations/0002_person_lastname.sql
+
+SET search_path TO "schneider-poc";
+
+ALTER TABLE person ADD COLUMN IF NOT EXISTS lastname VARCHAR(255) NOT NULL DEFAULT '';
+
+UPDATE person
+SET name = regexp_replace(name, '\s+\S+$', ''),
+    lastname = substring(name FROM '(\S+)$')
+WHERE lastname = '' AND name ~ '\S\s+\S';
@@ -0,0 +1,18 @@
+-- Store the role a person was created with ('plaintiff' or 'defendant').
+--
+-- Existing rows get the role they hold in a case, if any; persons only
+-- referenced as legal representatives keep a NULL role.
+--
+-- Apply with:
+--   psql "$DATABASE_CONNECTION_STRING" -f db/migrations/0003_person_role.sql
+
+SET search_path TO "schneider-poc";
+
+ALTER TABLE person ADD COLUMN IF NOT EXISTS role VARCHAR(20)
+    CHECK (role IN ('plaintiff', 'defendant'));
+
+UPDATE person SET role = 'plaintiff'
+WHERE role IS NULL AND id IN (SELECT plaintiff_id FROM "case");
+
+UPDATE person SET role = 'defendant'
+WHERE role IS NULL AND id IN (SELECT defendant_id FROM "case");
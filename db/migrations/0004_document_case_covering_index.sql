@@ -0,0 +1,20 @@
+-- Make the document(case_id) index from 0001 covering, so list_case_documents
+-- can read matching documents with an index-only scan.
+--
+-- note(case_id, timestamp) already exists (0001). document_tag(document_id,
+-- tag_id) and tag(name) are already covered by their primary key and unique
+-- constraint.
+--
+-- CONCURRENTLY avoids blocking writes while the index builds; it cannot run
+-- inside a transaction, so apply with psql's default autocommit:
+--   psql "$DATABASE_CONNECTION_STRING" -f db/migrations/0004_document_case_covering_index.sql
+--
+-- Verify afterwards with:
+--   EXPLAIN SELECT id, file_path, upload_timestamp FROM document WHERE case_id = 1;
+
+SET search_path TO "schneider-poc";
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS document_case_id_covering_idx
+    ON document (case_id) INCLUDE (id, file_path, upload_timestamp);
+
+DROP INDEX CONCURRENTLY IF EXISTS document_case_id_idx;
@@ -1,21 +1,49 @@
-from fastapi import FastAPI
+import logging
+from contextlib import asynccontextmanager
+import anyio.to_thread
+import psycopg2
+from fastapi import FastAPI, Request
+from fastapi.responses import ORJSONResponse
 from fastapi.middleware.cors import CORSMiddleware
-from rag.rag_engine import RAGEngine
-import os
+from rag.rag_engine import get_rag_engine
 from slowapi import _rate_limit_exceeded_handler
 from slowapi.errors import RateLimitExceeded
 from ratelimit import limiter
+from settings import CORS_ALLOWED_ORIGINS, THREADPOOL_SIZE
+from db import close_pool
 
-app = FastAPI()
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Sync handlers block a worker thread while they wait on Postgres, so the
+    # thread limit rather than the event loop caps concurrent requests
+    anyio.to_thread.current_default_thread_limiter().total_tokens = THREADPOOL_SIZE
+    # Build the RAG engine (Qdrant client, index, reranker) once instead of per /query request
+    app.state.rag = get_rag_engine()
+    yield
+    close_pool()
+
+app = FastAPI(default_response_class=ORJSONResponse, lifespan=lifespan)
 app.state.limiter = limiter
 app.add_exception_handler(RateLimitExceeded, _rate_limit_exceeded_handler)
 
+logger = logging.getLogger(__name__)
+
+# Unexpected errors are handled here once instead of in every route, and the
+# client gets a generic message instead of the internal error string
+@app.exception_handler(psycopg2.Error)
+async def database_error_handler(request: Request, exc: psycopg2.Error):
+    logger.error(f"Database error on {request.method} {request.url.path}", exc_info=exc)
+    return ORJSONResponse(status_code=500, content={"detail": "db error"})
+
+@app.exception_handler(Exception)
+async def unhandled_error_handler(request: Request, exc: Exception):
+    logger.error(f"Unhandled error on {request.method} {request.url.path}", exc_info=exc)
+    return ORJSONResponse(status_code=500, content={"detail": "Internal server error"})
+
 # CORS setup
-allowed_origins = os.getenv("CORS_ALLOWED_ORIGINS", "*").split(",")
-allowed_origins = [origin.strip() for origin in allowed_origins]
 app.add_middleware(
     CORSMiddleware,
-    allow_origins=allowed_origins,
+    allow_origins=CORS_ALLOWED_ORIGINS,
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"]
@@ -1,25 +1,20 @@
 from typing import Optional, List
+from contextvars import ContextVar
+from concurrent.futures import ThreadPoolExecutor
 from crewai import LLM, Agent, Task, Crew
 from crewai.tools import BaseTool
-import psycopg2
-import os
 import logging
-from dotenv import load_dotenv
 
-from rag.rag_engine import RAGEngine
+from rag.rag_engine import get_rag_engine
+from rag.semantic_cache import get_semantic_cache
 from rag.streaming_callback import StreamingCallback
-
-load_dotenv()
-DATABASE_CONNECTION_STRING = os.getenv("DATABASE_CONNECTION_STRING")
+from db import get_conn, execute_prepared
+from cache import case_documents_key, case_document_names_key, get_cached, set_cached
 
 # Set up logging
 logger = logging.getLogger(__name__)
 
-# Centralized singleton RAGEngine instance
-def get_rag_engine():
-    if not hasattr(get_rag_engine, "_instance"):
-        get_rag_engine._instance = RAGEngine(collection_name="law-test")
-    return get_rag_engine._instance
+SQL_DOCUMENT_NAMES_BY_CASE = 'SELECT id, file_path FROM document WHERE case_id = $1'
 
 def get_document_names_by_case_id(case_id: int) -> List[dict]:
     """
@@ -31,17 +26,56 @@ def get_document_names_by_case_id(case_id: int) -> List[dict]:
     Returns:
         List of dictionaries with document_id and file_path
     """
+    # Cached under the case's documents tag, so uploads invalidate it along with
+    # the /cases/{case_id}/documents listing
+    cache_key = case_document_names_key(case_id)
+    cached = get_cached(cache_key)
+    if cached is not None:
+        return cached
     try:
-        with psycopg2.connect(DATABASE_CONNECTION_STRING) as conn:
+        # Borrow a pooled connection (search_path is already set on it) instead of
+        # connecting to Postgres for every question
+        with get_conn() as conn:
             with conn.cursor() as cur:
-                cur.execute('SET SEARCH_PATH TO "schneider-poc";')
-                cur.execute('SELECT id, file_path FROM document WHERE case_id = %s;', (case_id,))
-                docs = cur.fetchall()
-                return [{"document_id": row[0], "file_path": row[1]} for row in docs]
+                execute_prepared(cur, "document_names_by_case", SQL_DOCUMENT_NAMES_BY_CASE, (case_id,))
+                docs = [{"document_id": row[0], "file_path": row[1]} for row in cur.fetchall()]
+        set_cached(cache_key, docs, tags=[case_documents_key(case_id)])
+        return docs
     except Exception as e:
         print(f"Error getting document names: {e}")
         return []
 
+# Results returned by RagTool during the current request. Callers read them after
+# kickoff instead of running the same retrieval again just to get the citations;
+# a ContextVar keeps concurrent requests (threads, WebSocket tasks) apart.
+_rag_results: ContextVar[Optional[List[dict]]] = ContextVar("rag_results", default=None)
+
+def capture_rag_results() -> List[dict]:
+    """
+    Start collecting RagTool results for the current context. Call this before
+    agent.kickoff; asyncio.to_thread copies the context, so the returned list
+    also receives results from tools run in a worker thread.
+    """
+    results: List[dict] = []
+    _rag_results.set(results)
+    return results
+
+def rag_citations(results: List[dict], question: str, case_id: Optional[int] = None) -> dict:
+    """
+    Combine the citations of the captured RagTool results. Falls back to querying
+    the RAG engine directly if the agent answered without using the tool.
+    """
+    if not results:
+        results = [get_rag_engine().query(query=question, case_id=case_id)]
+    citations = []
+    for result in results:
+        citations.extend(result.get("citations", []))
+    return {
+        "citations": citations,
+        "retrieved_chunks": sum(result.get("retrieved_chunks", 0) for result in results),
+        "case_id_filter": results[-1].get("case_id_filter")
+    }
+
 class RagTool(BaseTool):
     name: str = "RAG Legal Retrieval Tool"
     description: str = "Retrieves legal answers from the RAG system given a question and optional case_id."
@@ -50,12 +84,16 @@ class RagTool(BaseTool):
         rag_engine = get_rag_engine()
         result = rag_engine.query(query=query, case_id=case_id)
         # Return a structured response that includes both answer and citations
-        return {
+        output = {
             "answer": result.get("answer", ""),
             "citations": result.get("citations", []),
             "retrieved_chunks": result.get("retrieved_chunks", 0),
             "case_id_filter": result.get("case_id_filter")
         }
+        captured = _rag_results.get()
+        if captured is not None:
+            captured.append(output)
+        return output
 
 class CaseContextTool(BaseTool):
     name: str = "Case Context Retrieval Tool"
@@ -64,23 +102,44 @@ class CaseContextTool(BaseTool):
     def _run(self, case_id: int):
         rag_engine = get_rag_engine()
         chunks = rag_engine.get_chunks_by_case_id(case_id)
-        # Return only the text for each chunk, or include metadata if needed
-        return [
-            {"text": chunk["text"], "metadata": chunk["metadata"]}
-            for chunk in chunks
-        ]
+        # Parallel lists instead of one dict per chunk, and each document summary
+        # once instead of repeated in every chunk's metadata: this output becomes
+        # part of the agent's prompt, so repeated keys cost tokens
+        texts = []
+        metadata = []
+        summaries = {}
+        for chunk in chunks:
+            meta = chunk["metadata"]
+            summary = meta.pop("summary", None)
+            if summary:
+                summaries.setdefault(meta.get("file_name", ""), summary)
+            texts.append(chunk["text"])
+            metadata.append(meta)
+        return {"texts": texts, "metadata": metadata, "summaries": summaries}
+
+# The LLM client and tools hold no per-request state, so they are built once and
+# shared by every agent; only the callbacks differ between agents
+_agent_llm: Optional[LLM] = None
+_agent_tools: Optional[List[BaseTool]] = None
+
+def get_agent_llm() -> LLM:
+    global _agent_llm
+    if _agent_llm is None:
+        _agent_llm = LLM(
+            model="gpt-5-2025-08-07",
+            drop_params=True,
+            additional_drop_params=["stop"]
+        )
+    return _agent_llm
 
-def create_legal_agent(callbacks: List[StreamingCallback] = None) -> Agent:
-    """
-    Create a legal question answering agent with optional streaming callbacks.
-    
-    Args:
-        callbacks: List of streaming callbacks for real-time event streaming
-        
-    Returns:
-        Configured CrewAI Agent
-    """
-    agent_backstory = """
+def get_agent_tools() -> List[BaseTool]:
+    global _agent_tools
+    if _agent_tools is None:
+        _agent_tools = [RagTool(), CaseContextTool()]
+    return _agent_tools
+
+# Defined once so every agent gets the identical prompt text
+AGENT_BACKSTORY = """
     Role: You are a meticulous and highly strategic Senior Legal Analyst. Your primary mission is to answer user questions with unparalleled precision and efficiency by intelligently querying a complex legal database. Your reputation is built on finding the exact piece of information needed without wading through irrelevant material. All documents are in german. This means that you should use german keywords and phrases in your queries to the rag engine and that you should translate your answer in german.
 
 Core Directives:
@@ -151,57 +210,82 @@ Action Formulation: I will now call the rag_tool with the query "justification f
 (End of Thought process, agent proceeds to Action)
     """
 
+def create_legal_agent(callbacks: List[StreamingCallback] = None) -> Agent:
+    """
+    Create a legal question answering agent with optional streaming callbacks.
     
-    
+    Args:
+        callbacks: List of streaming callbacks for real-time event streaming
+        
+    Returns:
+        Configured CrewAI Agent
+    """
     return Agent(
         role="Legal Question Answering Agent",
         goal="Answer legal questions accurately using all available legal documents and tools.",
-        backstory=agent_backstory,
-        tools=[RagTool(), CaseContextTool()],
+        backstory=AGENT_BACKSTORY,
+        tools=get_agent_tools(),
         verbose=True,
-        llm=LLM(
-            model="gpt-5-2025-08-07",
-            drop_params=True,
-            additional_drop_params=["stop"]
-        ),
+        llm=get_agent_llm(),
         callbacks=callbacks or []
     )
 
 # Create default agent for backward compatibility
 legal_agent = create_legal_agent()
 
+def get_legal_agent(callbacks: List[StreamingCallback] = None) -> Agent:
+    """
+    Build an agent for one request. Agents keep per-run state (executor, tools
+    handler, RPM controller), so concurrent requests must not share one; building
+    is cheap because the LLM client and tools are shared.
+    """
+    return create_legal_agent(callbacks)
+
+# Runs document manifest lookups next to other per-question work
+_manifest_executor = ThreadPoolExecutor(max_workers=8, thread_name_prefix="manifest")
+
+def build_agent_query(question: str, case_id: Optional[int], documents: List[dict]) -> str:
+    """
+    Prefix the question with its case and, if there are any, the case's documents.
+    """
+    if case_id is None:
+        return question
+    if documents:
+        doc_manifest = "\n".join([f"documentId: '{doc['document_id']}', title: '{doc['file_path']}'" for doc in documents])
+        return f"[CASE {case_id}] Document Manifest:\n{doc_manifest}\n\nQuestion: {question}"
+    return f"[CASE {case_id}] {question}"
+
 def answer_legal_question(question: str, case_id: Optional[int] = None):
     """
     Use the CrewAI legal agent to answer a legal question, leveraging the RAG tool for retrieval.
     """
+    # Fetch the document manifest while the answer cache is checked; both wait on the network
+    manifest = _manifest_executor.submit(get_document_names_by_case_id, case_id) if case_id is not None else None
+    
+    # The agent answers from the shared RAG engine's collection
+    cache = get_semantic_cache("agent", get_rag_engine().collection_name)
+    question_embedding = None
+    if cache is not None:
+        cached, question_embedding = cache.get(question, case_id)
+        if cached is not None:
+            return cached
+    
     # Build query with document manifest if case_id is provided
-    query = question
-    if case_id is not None:
-        documents = get_document_names_by_case_id(case_id)
-        if documents:
-            doc_manifest = "\n".join([f"documentId: '{doc['document_id']}', title: '{doc['file_path']}'" for doc in documents])
-            query = f"[CASE {case_id}] Document Manifest:\n{doc_manifest}\n\nQuestion: {question}"
-        else:
-            query = f"[CASE {case_id}] {question}"
+    query = build_agent_query(question, case_id, manifest.result() if manifest is not None else [])
     
     # Log the query being sent to the agent
     logger.info(f"Sending query to legal agent: {query}")
     print(f"[AGENT QUERY] {query}")
     
-    result = legal_agent.kickoff(query)
-    
-    # The agent's raw output is just the answer string, but we need to get the citations
-    # from the RAG tool's execution. Let's call the RAG engine directly to get the full result
-    rag_engine = get_rag_engine()
-    rag_result = rag_engine.query(query=question, case_id=case_id)
+    rag_results = capture_rag_results()
+    result = get_legal_agent().kickoff(query)
     
-    # Return the full result with the agent's answer and RAG citations
-    return {
-        "answer": result.raw,
-        "citations": rag_result.get("citations", []),
-        "retrieved_chunks": rag_result.get("retrieved_chunks", 0),
-        "case_id_filter": rag_result.get("case_id_filter")
-    }
+    # The agent's raw output is just the answer string; the citations come from
+    # the RAG tool's execution during kickoff
+    answer = {"answer": result.raw, **rag_citations(rag_results, question, case_id)}
+    if cache is not None:
+        cache.put(question, case_id, answer, question_embedding)
+    return answer
 
 def answer_legal_question_streaming(
     question: str, 
@@ -219,18 +303,14 @@ def answer_legal_question_streaming(
     Returns:
         Dictionary with answer and metadata
     """
-    # Create agent with streaming callback
-    agent = create_legal_agent(callbacks=[callback] if callback else [])
+    # Fetch the document manifest in the background
+    manifest = _manifest_executor.submit(get_document_names_by_case_id, case_id) if case_id is not None else None
+    
+    # Agent with the streaming callback
+    agent = get_legal_agent(callbacks=[callback] if callback else None)
     
     # Build query with document manifest if case_id is provided
-    query = question
-    if case_id is not None:
-        documents = get_document_names_by_case_id(case_id)
-        if documents:
-            doc_manifest = "\n".join([f"documentId: '{doc['document_id']}', title: '{doc['file_path']}'" for doc in documents])
-            query = f"[CASE {case_id}] Document Manifest:\n{doc_manifest}\n\nQuestion: {question}"
-        else:
-            query = f"[CASE {case_id}] {question}"
+    query = build_agent_query(question, case_id, manifest.result() if manifest is not None else [])
 
     # Log the query being sent to the agent
     logger.info(f"Sending query to legal agent (streaming): {query}")
@@ -244,6 +324,7 @@ def answer_legal_question_streaming(
         )
     
     # Run agent
+    rag_results = capture_rag_results()
     result = agent.kickoff(query)
 
     # Emit thinking_end event if callback is provided
@@ -253,17 +334,8 @@ def answer_legal_question_streaming(
             conclusion="Completed reasoning and generated answer."
         )
     
-    # Get RAG citations
-    rag_engine = get_rag_engine()
-    rag_result = rag_engine.query(query=question, case_id=case_id)
-    
-    # Return the full result with the agent's answer and RAG citations
-    return {
-        "answer": result.raw,
-        "citations": rag_result.get("citations", []),
-        "retrieved_chunks": rag_result.get("retrieved_chunks", 0),
-        "case_id_filter": rag_result.get("case_id_filter")
-    }
+    # Return the full result with the agent's answer and the citations its RAG tool retrieved
+    return {"answer": result.raw, **rag_citations(rag_results, question, case_id)}
 
 # Alias for backward compatibility
 create_streaming_agent = create_legal_agent 
\ No newline at end of file
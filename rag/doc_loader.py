@@ -1,12 +1,106 @@
 from typing import List, Optional
 from llama_index.core.schema import Document
+import io
 import os
+import zipfile
 
 try:
     from docx import Document as DocxDocument
 except ImportError:
     raise ImportError("Please install python-docx: pip install python-docx")
 
+try:
+    from lxml import etree
+except ImportError:
+    raise ImportError("Please install lxml: pip install lxml")
+
+# WordprocessingML element tags for paragraphs and their text runs
+_W_NAMESPACE = "{http://schemas.openxmlformats.org/wordprocessingml/2006/main}"
+_W_BODY = f"{_W_NAMESPACE}body"
+_W_P = f"{_W_NAMESPACE}p"
+_W_TBL = f"{_W_NAMESPACE}tbl"
+_W_R = f"{_W_NAMESPACE}r"
+_W_T = f"{_W_NAMESPACE}t"
+_W_BR = f"{_W_NAMESPACE}br"
+_W_TYPE = f"{_W_NAMESPACE}type"
+
+# Text written for the non-w:t run children, as python-docx's Paragraph.text does
+_RUN_CHILD_TEXT = {
+    f"{_W_NAMESPACE}tab": "\t",
+    f"{_W_NAMESPACE}ptab": "\t",
+    f"{_W_NAMESPACE}cr": "\n",
+    f"{_W_NAMESPACE}noBreakHyphen": "-"
+}
+
+# Main document part inside the .docx zip archive
+_DOCUMENT_PART = "word/document.xml"
+
+def _write_paragraphs(buffer: io.StringIO, paragraphs) -> None:
+    separator = ""
+    for paragraph in paragraphs:
+        buffer.write(separator)
+        separator = "\n"
+        # Only run children count: w:pPr also holds w:tab elements (tab stops)
+        for run in paragraph.iter(_W_R):
+            for child in run:
+                if child.tag == _W_T:
+                    if child.text:
+                        buffer.write(child.text)
+                elif child.tag == _W_BR:
+                    # Page and column breaks add no text, line breaks do
+                    if child.get(_W_TYPE, "textWrapping") == "textWrapping":
+                        buffer.write("\n")
+                else:
+                    buffer.write(_RUN_CHILD_TEXT.get(child.tag, ""))
+
+def _docx_text(docx) -> str:
+    """
+    Join the text of all paragraphs (one per line) straight from the document XML,
+    without building a python-docx Paragraph wrapper for each one. Runs are
+    written into one StringIO buffer, so no per-paragraph string or list of
+    paragraphs is built before the final value.
+    """
+    buffer = io.StringIO()
+    _write_paragraphs(buffer, docx.element.body.iter(_W_P))
+    return buffer.getvalue()
+
+def _iter_paragraphs(xml_file):
+    # Paragraphs are cleared once their text has been written, and the blocks
+    # before each finished top-level paragraph or table are removed from the
+    # body, so finished paragraphs and tables do not pile up in the parsed tree
+    for _, element in etree.iterparse(xml_file, tag=(_W_P, _W_TBL)):
+        if element.tag == _W_P:
+            yield element
+        element.clear()
+        parent = element.getparent()
+        if parent is not None and parent.tag == _W_BODY:
+            while element.getprevious() is not None:
+                del parent[0]
+
+def _docx_text_streaming(source) -> str:
+    """
+    Read the paragraph text by pull-parsing word/document.xml from the zip
+    archive, without loading the document (and its styles, numbering and
+    relationship parts) through python-docx.
+    """
+    buffer = io.StringIO()
+    with zipfile.ZipFile(source) as archive:
+        with archive.open(_DOCUMENT_PART) as xml_file:
+            _write_paragraphs(buffer, _iter_paragraphs(xml_file))
+    return buffer.getvalue()
+
+def _load_text(source) -> str:
+    """
+    Extract the text of a .docx path or file-like object, falling back to
+    python-docx if the archive cannot be read directly.
+    """
+    try:
+        return _docx_text_streaming(source)
+    except (zipfile.BadZipFile, KeyError, etree.XMLSyntaxError):
+        if hasattr(source, "seek"):
+            source.seek(0)
+        return _docx_text(DocxDocument(source))
+
 def load_docx_as_documents(file_path: Optional[str] = None, text: Optional[str] = None, file_obj=None) -> List[Document]:
     """
     Load a .docx file from the local filesystem, a file-like object, or accept a string, returning a list of LlamaIndex Document objects.
@@ -22,19 +116,9 @@ def load_docx_as_documents(file_path: Optional[str] = None, text: Optional[str]
     if text is not None:
         return [Document(text=text)]
     if file_obj is not None:
-        docx = DocxDocument(file_obj)
-        full_text = []
-        for para in docx.paragraphs:
-            full_text.append(para.text)
-        content = "\n".join(full_text)
-        return [Document(text=content)]
+        return [Document(text=_load_text(file_obj))]
     if file_path is None:
         raise ValueError("Either file_path, file_obj, or text must be provided.")
     if not os.path.exists(file_path):
         raise FileNotFoundError(f"File not found: {file_path}")
-    docx = DocxDocument(file_path)
-    full_text = []
-    for para in docx.paragraphs:
-        full_text.append(para.text)
-    content = "\n".join(full_text)
-    return [Document(text=content)]  
\ No newline at end of file
+    return [Document(text=_load_text(file_path))]
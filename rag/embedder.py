@@ -1,13 +1,118 @@
+import numpy as np
+from concurrent.futures import ThreadPoolExecutor
+from llama_index.core.base.embeddings.base import BaseEmbedding
 from llama_index.embeddings.openai import OpenAIEmbedding
-from typing import List
+from typing import List, Optional
+from rag.embedding_cache import get_embedding_cache
+from rag.llm_provider import get_openai_http_client
+from rag.summarizer import summary_augmented_text
+
+EMBED_MODEL_NAME = "text-embedding-3-large"
+EMBED_DIMENSIONS = 3072
+# Texts per embeddings API request; LlamaIndex defaults to 10, the API accepts up to 2048
+EMBED_BATCH_SIZE = 256
+# Embeddings API requests sent at once when a call spans several batches
+EMBED_CONCURRENCY = 4
+
+_embed_executor = ThreadPoolExecutor(max_workers=EMBED_CONCURRENCY, thread_name_prefix="embed")
+
+# Global embedding model instance for reuse
+_embed_model: Optional[OpenAIEmbedding] = None
+
+def get_embed_model() -> OpenAIEmbedding:
+    """
+    Get the shared OpenAIEmbedding instance, creating it on first use.
+
+    Reusing one instance keeps its HTTP client (and open connections to the
+    embeddings API) alive across uploads and queries.
+    """
+    global _embed_model
+    if _embed_model is None:
+        _embed_model = OpenAIEmbedding(
+            model=EMBED_MODEL_NAME,
+            dimensions=EMBED_DIMENSIONS,
+            embed_batch_size=EMBED_BATCH_SIZE,
+            http_client=get_openai_http_client()
+        )
+    return _embed_model
+
+def embed_texts(texts: List[str]) -> np.ndarray:
+    """
+    Embed texts with EMBED_BATCH_SIZE texts per API request, serving texts that
+    were embedded before from the embedding cache.
+
+    Returns:
+        float32 array with one row per text (12 KB per vector instead of ~86 KB
+        as a list of Python floats)
+    """
+    embed_model = get_embed_model()
+
+    def compute(missing: List[str]) -> List[List[float]]:
+        batches = [missing[start:start + EMBED_BATCH_SIZE] for start in range(0, len(missing), EMBED_BATCH_SIZE)]
+        if len(batches) <= 1:
+            return embed_model.get_text_embedding_batch(missing, show_progress=False)
+        # Send the batches concurrently over the shared HTTP client instead of one after another
+        results = _embed_executor.map(lambda batch: embed_model.get_text_embedding_batch(batch, show_progress=False), batches)
+        return [vector for batch in results for vector in batch]
+
+    cache = get_embedding_cache(f"{EMBED_MODEL_NAME}:{EMBED_DIMENSIONS}")
+    if cache is None:
+        return np.asarray(compute(texts), dtype=np.float32)
+    return cache.get_or_compute_batch(texts, compute)
+
+def embed_query(query: str) -> np.ndarray:
+    """
+    Embed a search query as a float32 array, using the embedding cache for
+    repeated questions.
+    """
+    embed_model = get_embed_model()
+    cache = get_embedding_cache(f"{EMBED_MODEL_NAME}:{EMBED_DIMENSIONS}")
+    if cache is None:
+        return np.asarray(embed_model.get_query_embedding(query), dtype=np.float32)
+    return cache.get_or_compute(query, embed_model.get_query_embedding)
 
 def embed_nodes(nodes: List) -> None:
     """
     Embeds each node's content using OpenAIEmbedding and sets the embedding on the node.
+    Texts are sent in batches of EMBED_BATCH_SIZE per API request instead of one request per node,
+    and texts already in the embedding cache are not sent at all. Nodes with a "summary"
+    in their metadata are embedded with the summary in front of their content.
+    Each node's embedding is a float32 row of one shared array.
+    """
+    if not nodes:
+        return
+    embeddings = embed_texts([
+        summary_augmented_text(node.get_content(), (getattr(node, "metadata", None) or {}).get("summary"))
+        for node in nodes
+    ])
+    for node, embedding in zip(nodes, embeddings):
+        node.embedding = embedding
+
+class CachedEmbedding(BaseEmbedding):
+    """
+    LlamaIndex embedding model that goes through embed_texts / embed_query, for
+    components such as SemanticSplitterNodeParser that take an embed_model.
+
+    embed_batch_size is set high so LlamaIndex hands over all texts in one call;
+    embed_texts then splits them into EMBED_BATCH_SIZE requests sent concurrently
+    and skips texts that are already in the embedding cache.
     """
-    embed_model = OpenAIEmbedding(model="text-embedding-3-large", dimensions=3072)
 
-    for node in nodes:
-        text = node.get_content()
-        embedding = embed_model.get_text_embedding(text)
-        node.embedding = embedding 
\ No newline at end of file
+    def __init__(self, **kwargs):
+        super().__init__(model_name=EMBED_MODEL_NAME, embed_batch_size=2048, **kwargs)
+
+    @classmethod
+    def class_name(cls) -> str:
+        return "CachedEmbedding"
+
+    def _get_query_embedding(self, query: str) -> List[float]:
+        return embed_query(query).tolist()
+
+    async def _aget_query_embedding(self, query: str) -> List[float]:
+        return self._get_query_embedding(query)
+
+    def _get_text_embedding(self, text: str) -> List[float]:
+        return embed_texts([text])[0].tolist()
+
+    def _get_text_embeddings(self, texts: List[str]) -> List[List[float]]:
+        return embed_texts(texts).tolist()
@@ -0,0 +1,100 @@
+"""
+Content-addressed cache of embedding vectors, stored in SQLite.
+
+Vectors are keyed by the SHA-256 of the embedding model name and the stripped
+text, so re-indexing a document or asking the same question again does not call
+the embeddings API. They are stored as float16 (6 KB per 3072-dim vector).
+
+Configure via environment variables (see settings.py):
+- EMBEDDING_CACHE_PATH=embedding_cache.sqlite3 (caching is disabled when empty)
+"""
+
+import hashlib
+import logging
+import sqlite3
+import threading
+from typing import Callable, Dict, List, Optional, Sequence
+import numpy as np
+from settings import EMBEDDING_CACHE_PATH
+
+logger = logging.getLogger(__name__)
+
+# SQLite limits the number of bound parameters per statement
+_SELECT_CHUNK_SIZE = 500
+
+class EmbeddingCache:
+    def __init__(self, path: str, model_name: str):
+        self.model_name = model_name
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        with self._lock:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("CREATE TABLE IF NOT EXISTS emb (hash BLOB PRIMARY KEY, vec BLOB NOT NULL)")
+            self._conn.commit()
+
+    def _key(self, text: str) -> bytes:
+        return hashlib.sha256(f"{self.model_name}\n{text.strip()}".encode()).digest()
+
+    def _get_many(self, keys: List[bytes]) -> Dict[bytes, np.ndarray]:
+        found = {}
+        with self._lock:
+            for start in range(0, len(keys), _SELECT_CHUNK_SIZE):
+                chunk = keys[start:start + _SELECT_CHUNK_SIZE]
+                placeholders = ", ".join("?" * len(chunk))
+                rows = self._conn.execute(f"SELECT hash, vec FROM emb WHERE hash IN ({placeholders})", chunk)
+                for key, vec in rows:
+                    found[key] = np.frombuffer(vec, dtype=np.float16).astype(np.float32)
+        return found
+
+    def _put_many(self, items: Dict[bytes, np.ndarray]):
+        with self._lock:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO emb (hash, vec) VALUES (?, ?)",
+                [(key, np.asarray(vector, dtype=np.float16).tobytes()) for key, vector in items.items()]
+            )
+            self._conn.commit()
+
+    def get_or_compute_batch(self, texts: List[str], compute_fn: Callable[[List[str]], Sequence]) -> np.ndarray:
+        """
+        Return a float32 array with one embedding row per text, calling compute_fn
+        only for the texts that are not cached (each distinct text at most once).
+        """
+        if not texts:
+            return np.empty((0, 0), dtype=np.float32)
+        keys = [self._key(text) for text in texts]
+        try:
+            found = self._get_many(list(dict.fromkeys(keys)))
+        except sqlite3.Error as e:
+            logger.warning(f"Embedding cache read failed: {e}")
+            found = {}
+        missing = {}
+        for key, text in zip(keys, texts):
+            if key not in found and key not in missing:
+                missing[key] = text
+        if missing:
+            computed = dict(zip(missing.keys(), np.asarray(compute_fn(list(missing.values())), dtype=np.float32)))
+            try:
+                self._put_many(computed)
+            except sqlite3.Error as e:
+                logger.warning(f"Embedding cache write failed: {e}")
+            found.update(computed)
+        return np.stack([found[key] for key in keys])
+
+    def get_or_compute(self, text: str, compute_fn: Callable[[str], Sequence[float]]) -> np.ndarray:
+        return self.get_or_compute_batch([text], lambda texts: [compute_fn(texts[0])])[0]
+
+_cache: Optional[EmbeddingCache] = None
+_cache_lock = threading.Lock()
+
+def get_embedding_cache(model_name: str) -> Optional[EmbeddingCache]:
+    """
+    Get the shared embedding cache, or None if EMBEDDING_CACHE_PATH is empty.
+    """
+    global _cache
+    if not EMBEDDING_CACHE_PATH:
+        return None
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = EmbeddingCache(EMBEDDING_CACHE_PATH, model_name)
+    return _cache
@@ -19,22 +19,61 @@ Local/Ollama:
 """
 
 import os
+import threading
 from abc import ABC, abstractmethod
-from typing import Dict, Any
+from typing import Dict, Any, Iterator, Optional
+import httpx
 from dotenv import load_dotenv
 
 load_dotenv()
 
+# One HTTP client (and connection pool) for every OpenAI API caller in the process:
+# the chat provider and the embedding model reuse warm keep-alive connections
+# instead of each doing its own TCP + TLS handshakes
+_openai_http_client: Optional[httpx.Client] = None
+_openai_client = None
+_openai_lock = threading.Lock()
+
+def get_openai_http_client() -> httpx.Client:
+    global _openai_http_client
+    if _openai_http_client is None:
+        with _openai_lock:
+            if _openai_http_client is None:
+                _openai_http_client = httpx.Client(
+                    limits=httpx.Limits(max_keepalive_connections=20, max_connections=50),
+                    timeout=httpx.Timeout(60.0, connect=5.0)
+                )
+    return _openai_http_client
+
+def get_openai_client():
+    """
+    Get the shared openai.OpenAI client, creating it on first use.
+    """
+    global _openai_client
+    if _openai_client is None:
+        import openai
+        http_client = get_openai_http_client()
+        with _openai_lock:
+            if _openai_client is None:
+                _openai_client = openai.OpenAI(api_key=os.getenv("OPENAI_API_KEY"), http_client=http_client)
+    return _openai_client
+
 class LLMProvider(ABC):
     @abstractmethod
     def generate_response(self, messages: list, max_tokens: int = 1500, temperature: float = 0.1) -> str:
         """Generate a response from the LLM given a list of messages."""
         pass
 
+    def stream_response(self, messages: list, max_tokens: int = 1500, temperature: float = 0.1) -> Iterator[str]:
+        """
+        Yield the response in pieces as the LLM generates it. Providers without
+        streaming support yield the whole response at once.
+        """
+        yield self.generate_response(messages, max_tokens=max_tokens, temperature=temperature)
+
 class OpenAIProvider(LLMProvider):
     def __init__(self, model: str = "gpt-4-turbo-preview"):
-        import openai
-        self.client = openai.OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+        self.client = get_openai_client()
         self.model = model
 
     def generate_response(self, messages: list, max_tokens: int = 1500, temperature: float = 0.1) -> str:
@@ -46,6 +85,18 @@ class OpenAIProvider(LLMProvider):
         )
         return response.choices[0].message.content
 
+    def stream_response(self, messages: list, max_tokens: int = 1500, temperature: float = 0.1) -> Iterator[str]:
+        stream = self.client.chat.completions.create(
+            model=self.model,
+            messages=messages,
+            max_tokens=max_tokens,
+            temperature=temperature,
+            stream=True
+        )
+        for chunk in stream:
+            if chunk.choices and chunk.choices[0].delta.content:
+                yield chunk.choices[0].delta.content
+
 class AnthropicProvider(LLMProvider):
     def __init__(self, model: str = "claude-3-opus-20240229"):
         try:
@@ -55,7 +106,7 @@ class AnthropicProvider(LLMProvider):
         except ImportError:
             raise ImportError("Please install anthropic: pip install anthropic")
 
-    def generate_response(self, messages: list, max_tokens: int = 1500, temperature: float = 0.1) -> str:
+    def _split_messages(self, messages: list):
         # Convert OpenAI format to Anthropic format
         system_message = ""
         user_messages = []
@@ -65,6 +116,10 @@ class AnthropicProvider(LLMProvider):
                 system_message = msg["content"]
             else:
                 user_messages.append(msg)
+        return system_message, user_messages
+
+    def generate_response(self, messages: list, max_tokens: int = 1500, temperature: float = 0.1) -> str:
+        system_message, user_messages = self._split_messages(messages)
         
         response = self.client.messages.create(
             model=self.model,
@@ -75,6 +130,18 @@ class AnthropicProvider(LLMProvider):
         )
         return response.content[0].text
 
+    def stream_response(self, messages: list, max_tokens: int = 1500, temperature: float = 0.1) -> Iterator[str]:
+        system_message, user_messages = self._split_messages(messages)
+        
+        with self.client.messages.stream(
+            model=self.model,
+            max_tokens=max_tokens,
+            temperature=temperature,
+            system=system_message,
+            messages=user_messages
+        ) as stream:
+            yield from stream.text_stream
+
 class OllamaProvider(LLMProvider):
     def __init__(self, model: str, base_url: str = "http://localhost:11434"):
         try:
@@ -2,15 +2,49 @@
 Centralized Qdrant client factory for consistent client configuration across the application.
 """
 
-import os
-from typing import Optional
-from dotenv import load_dotenv
+import threading
+from typing import Dict, Optional, Set
 from qdrant_client import QdrantClient
-from qdrant_client.models import Distance, VectorParams
+from qdrant_client.models import (
+    Distance,
+    VectorParams,
+    VectorParamsDiff,
+    PayloadSchemaType,
+    BinaryQuantization,
+    BinaryQuantizationConfig,
+    ScalarQuantization,
+    ScalarQuantizationConfig,
+    ScalarType,
+    SearchParams,
+    QuantizationSearchParams
+)
+from settings import QDRANT_HOST, QDRANT_API_KEY, QDRANT_QUANTIZATION
 
 # Global client instance for reuse
 _client_instance: Optional[QdrantClient] = None
 
+# Collections known to exist, so uploads don't list all collections on every call
+_known_collections: Set[str] = set()
+_known_collections_lock = threading.Lock()
+
+# Quantization keeps a compressed copy of every vector in RAM for candidate
+# scoring (1 bit per dimension for binary, 1 byte for int8); the original vectors
+# stay on disk and are only read to rescore the oversampled candidates
+QUANTIZATION_CONFIGS = {
+    "binary": BinaryQuantization(binary=BinaryQuantizationConfig(always_ram=True)),
+    "int8": ScalarQuantization(scalar=ScalarQuantizationConfig(type=ScalarType.INT8, quantile=0.99, always_ram=True)),
+    "none": None
+}
+if QDRANT_QUANTIZATION not in QUANTIZATION_CONFIGS:
+    raise ValueError(f"QDRANT_QUANTIZATION must be one of {list(QUANTIZATION_CONFIGS)}, got '{QDRANT_QUANTIZATION}'")
+QUANTIZATION_CONFIG = QUANTIZATION_CONFIGS[QDRANT_QUANTIZATION]
+QUANTIZED_SEARCH_PARAMS = SearchParams(
+    quantization=QuantizationSearchParams(rescore=True, oversampling=2.0)
+) if QUANTIZATION_CONFIG is not None else None
+
+# Payload fields filtered on by RAGEngine (case filters on search, recommend and scroll)
+DEFAULT_PAYLOAD_INDEXES = {"case_id": PayloadSchemaType.INTEGER}
+
 def get_qdrant_client() -> QdrantClient:
     """
     Factory method to get a configured Qdrant client instance.
@@ -30,12 +64,6 @@ def get_qdrant_client() -> QdrantClient:
     if _client_instance is not None:
         return _client_instance
     
-    # Load environment variables
-    load_dotenv()
-    
-    QDRANT_HOST = os.getenv("QDRANT_HOST")
-    QDRANT_API_KEY = os.getenv("QDRANT_API_KEY")
-    
     if not QDRANT_HOST:
         raise ValueError("QDRANT_HOST must be set in environment variables")
     
@@ -59,13 +87,24 @@ def get_qdrant_client() -> QdrantClient:
         _client_instance = None  # Reset on failure
         raise Exception(f"Failed to create Qdrant client: {e}")
 
-def create_collection_if_not_exists(collection_name: str, vector_size: int = 3072) -> bool:
+def create_collection_if_not_exists(
+    collection_name: str,
+    vector_size: int = 3072,
+    payload_indexes: Optional[Dict[str, PayloadSchemaType]] = None,
+    quantize: bool = True,
+    on_disk_payload: bool = True
+) -> bool:
     """
-    Creates a Qdrant collection if it doesn't already exist.
+    Creates a Qdrant collection if it doesn't already exist, and makes sure the
+    payload fields used in filters are indexed.
     
     Args:
         collection_name: Name of the collection to create
         vector_size: Size of the vector embeddings (default: 3072 for text-embedding-3-large)
+        payload_indexes: Payload field -> type to index (default: DEFAULT_PAYLOAD_INDEXES)
+        quantize: Apply QDRANT_QUANTIZATION and keep the full vectors on disk; pass
+            False for small, latency-critical collections that should stay in RAM
+        on_disk_payload: Keep payloads on disk instead of in RAM
         
     Returns:
         bool: True if collection was created, False if it already existed
@@ -73,30 +112,71 @@ def create_collection_if_not_exists(collection_name: str, vector_size: int = 307
     Raises:
         Exception: If collection creation fails
     """
+    if collection_name in _known_collections:
+        return False
+    
     client = get_qdrant_client()
     
     try:
-        # Check if collection exists
-        collections = client.get_collections().collections
-        collection_exists = any(c.name == collection_name for c in collections)
-        
-        if collection_exists:
-            return False
-        
-        # Create collection
-        client.create_collection(
-            collection_name=collection_name,
-            vectors_config=VectorParams(
-                size=vector_size,
-                distance=Distance.COSINE
-            )
-        )
-        
-        return True
+        with _known_collections_lock:
+            if collection_name in _known_collections:
+                return False
+            
+            # Check if collection exists
+            created = not client.collection_exists(collection_name)
+            if created:
+                quantization_config = QUANTIZATION_CONFIG if quantize else None
+                client.create_collection(
+                    collection_name=collection_name,
+                    vectors_config=VectorParams(
+                        size=vector_size,
+                        distance=Distance.COSINE,
+                        # Full vectors are only needed for rescoring once quantized
+                        on_disk=quantization_config is not None
+                    ),
+                    quantization_config=quantization_config,
+                    on_disk_payload=on_disk_payload
+                )
+            
+            # Without an index, a filtered search or scroll checks the payload of
+            # every point; existing collections get their missing indexes here too
+            existing = client.get_collection(collection_name).payload_schema or {}
+            for field_name, field_schema in (payload_indexes or DEFAULT_PAYLOAD_INDEXES).items():
+                if field_name not in existing:
+                    client.create_payload_index(collection_name, field_name=field_name, field_schema=field_schema, wait=True)
+            _known_collections.add(collection_name)
+            
+            return created
         
     except Exception as e:
         raise Exception(f"Failed to create collection '{collection_name}': {e}")
 
+def apply_quantization(collection_name: str) -> bool:
+    """
+    Apply QDRANT_QUANTIZATION to a collection created before quantization was
+    enabled, and move its full vectors to disk. Qdrant builds the quantized
+    vectors in the background; searches keep working meanwhile.
+    
+    Args:
+        collection_name: Name of an existing collection
+        
+    Returns:
+        bool: True if the collection was updated, False if it was already quantized
+        or quantization is disabled
+    """
+    if QUANTIZATION_CONFIG is None:
+        return False
+    client = get_qdrant_client()
+    if client.get_collection(collection_name).config.quantization_config is not None:
+        return False
+    client.update_collection(
+        collection_name=collection_name,
+        # "" is the collection's unnamed default vector
+        vectors_config={"": VectorParamsDiff(on_disk=True)},
+        quantization_config=QUANTIZATION_CONFIG
+    )
+    return True
+
 def reset_client():
     """
     Reset the global client instance. Useful for testing or config changes.
@@ -108,6 +188,7 @@ def reset_client():
         except:
             pass
     _client_instance = None
+    _known_collections.clear()
 
 def test_qdrant_connection() -> bool:
     """
@@ -1,13 +1,14 @@
-import os
 import uuid
 from typing import List
-from dotenv import load_dotenv
-from qdrant_client.models import PointStruct
+import numpy as np
 from .qdrant_client_factory import get_qdrant_client, create_collection_if_not_exists
 
 # Node type hint: should have get_embedding() and get_content() methods
 
-def upload_nodes_to_qdrant(nodes: List, collection_name: str = "law-test", case_id: int = None):
+# Points sent per upload request; keeps each request well below gRPC's message size limit
+UPLOAD_BATCH_SIZE = 256
+
+def upload_nodes_to_qdrant(nodes: List, collection_name: str = "law-test", case_id: int = None, batch_size: int = UPLOAD_BATCH_SIZE):
     """
     Uploads semantic nodes (with embeddings) to a Qdrant collection using the centralized client factory.
 
@@ -15,6 +16,7 @@ def upload_nodes_to_qdrant(nodes: List, collection_name: str = "law-test", case_
         nodes: List of nodes (from semantic_chunk_documents), each with get_embedding() and get_content().
         collection_name: Name of the Qdrant collection to upload to.
         case_id: Optional case ID to include as metadata in each node's payload.
+        batch_size: Maximum number of points sent per upload request.
     """
     # Get client from factory
     client = get_qdrant_client()
@@ -24,17 +26,28 @@ def upload_nodes_to_qdrant(nodes: List, collection_name: str = "law-test", case_
     if collection_created:
         print(f"✓ Created collection '{collection_name}'")
     
-    # Prepare points for upload
-    points = []
+    # Keep only nodes that have an embedding
+    embedded_nodes = []
     skipped_count = 0
-    
     for i, node in enumerate(nodes):
-        embedding = node.get_embedding()
-        if embedding is None:
+        if node.get_embedding() is None:
             print(f"Skipping node {i+1} because it does not have an embedding.")
             skipped_count += 1
             continue
-            
+        embedded_nodes.append(node)
+    
+    if not embedded_nodes:
+        print("No valid points to upload (all nodes missing embeddings)")
+        return
+    
+    # Vectors go into one contiguous float32 array (4 bytes per value instead of a
+    # Python float object each), which the client sends without per-point conversion
+    dim = len(embedded_nodes[0].get_embedding())
+    vectors = np.empty((len(embedded_nodes), dim), dtype=np.float32)
+    payloads = []
+    for i, node in enumerate(embedded_nodes):
+        vectors[i] = node.get_embedding()
+        
         # Build payload
         payload = {"text": node.get_content()}
         if case_id is not None:
@@ -43,32 +56,26 @@ def upload_nodes_to_qdrant(nodes: List, collection_name: str = "law-test", case_
         # Add metadata if available
         if hasattr(node, "metadata") and isinstance(node.metadata, dict):
             payload.update(node.metadata)
-        
-        # Create point
-        point = PointStruct(
-            id=str(uuid.uuid4()),
-            vector=embedding,
-            payload=payload
-        )
-        points.append(point)
-    
-    if not points:
-        print("No valid points to upload (all nodes missing embeddings)")
-        return
+        payloads.append(payload)
+    ids = [str(uuid.uuid4()) for _ in embedded_nodes]
     
     # Upload points to Qdrant
     try:
-        print(f"Uploading {len(points)} points to collection '{collection_name}'...")
-        operation_info = client.upsert(
+        print(f"Uploading {len(ids)} points to collection '{collection_name}'...")
+        # upload_collection splits the arrays into batches and retries failed ones;
+        # the client's gRPC channel is reused across batches
+        client.upload_collection(
             collection_name=collection_name,
-            wait=True,
-            points=points
+            vectors=vectors,
+            payload=payloads,
+            ids=ids,
+            batch_size=batch_size,
+            wait=True
         )
         
-        print(f"✓ Successfully uploaded {len(points)} points")
+        print(f"✓ Successfully uploaded {len(ids)} points")
         if skipped_count > 0:
             print(f"⚠️  Skipped {skipped_count} nodes without embeddings")
-        print(f"Operation info: {operation_info}")
         
     except Exception as e:
         print(f"❌ Failed to upload points to Qdrant: {e}")
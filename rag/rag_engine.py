@@ -1,18 +1,43 @@
 from llama_index.core import VectorStoreIndex, SimpleDirectoryReader, StorageContext, Settings
-from llama_index.embeddings.openai import OpenAIEmbedding
 from llama_index.vector_stores.qdrant import QdrantVectorStore
-from llama_index.core.query_engine import CitationQueryEngine
-from llama_index.core.vector_stores import MetadataFilter, MetadataFilters, FilterOperator
+from llama_index.core.schema import NodeWithScore, TextNode
+from qdrant_client import models
+import uuid
+import numpy as np
+from concurrent.futures import ThreadPoolExecutor
+from typing import Iterator, List, Optional, Tuple
 from dotenv import load_dotenv
-from rag.qdrant_client_factory import get_qdrant_client, create_collection_if_not_exists
+from rag.qdrant_client_factory import get_qdrant_client, create_collection_if_not_exists, QUANTIZED_SEARCH_PARAMS
 from rag.reranker import create_reranker_from_config, get_reranker_config
+from rag.embedder import CachedEmbedding, embed_query
+from rag.llm_provider import get_llm_provider
+from rag.semantic_cache import get_semantic_cache, invalidate_case
+
+# Same instructions as LlamaIndex's CitationQueryEngine, sent with the numbered sources
+CITATION_SYSTEM_PROMPT = (
+    "Please provide an answer based solely on the provided sources. "
+    "When referencing information from a source, cite the appropriate source(s) "
+    "using their corresponding numbers, e.g. [1]. Every answer should include at "
+    "least one source citation. Only cite a source when you are explicitly "
+    "referencing it. If none of the sources are helpful, you should indicate that."
+)
+
+# Chunks fetched from Qdrant per query before reranking. Chunks are embedded with
+# their document's summary, so 3 candidates are fetched instead of the 7 used for
+# plain chunks
+RETRIEVAL_LIMIT = 3
+
+# Cases with more chunks than this are scrolled in SCROLL_PARTITIONS concurrent id ranges
+PARALLEL_SCROLL_THRESHOLD = 5000
+SCROLL_PARTITIONS = 8
 
 class RAGEngine:
     def __init__(self, collection_name="law-test"):
         load_dotenv()
         
-        # Configure global settings instead of ServiceContext
-        Settings.embed_model = OpenAIEmbedding(model="text-embedding-3-large", dimensions=3072)
+        # Configure global settings instead of ServiceContext; index_file embeds
+        # through the embedding cache, so re-indexing a file does not call the API
+        Settings.embed_model = CachedEmbedding()
         
         # Get client from factory
         self.client = get_qdrant_client()
@@ -26,6 +51,9 @@ class RAGEngine:
         self.storage_context = StorageContext.from_defaults(vector_store=self.vector_store)
         self.index = VectorStoreIndex.from_vector_store(self.vector_store)
         
+        # LLM client used to answer from the retrieved chunks
+        self.llm = get_llm_provider()
+        
         # Initialize reranker
         self.reranker = create_reranker_from_config()
         self.reranker_config = get_reranker_config()
@@ -40,50 +68,94 @@ class RAGEngine:
         # Load and index documents
         docs = SimpleDirectoryReader(input_files=[file_path]).load_data()
         self.index.insert_documents(docs)
+        # Cached answers may be missing the new document
+        invalidate_case(case_id, self.collection_name)
 
-    def query(self, query: str, case_id: int = None) -> dict:
-        # Configure node postprocessors (including reranker if available)
-        node_postprocessors = []
-        if self.reranker:
-            node_postprocessors.append(self.reranker)
-        
-        # Build metadata filter if case_id is provided
-        filters = None
-        if case_id is not None:
-            filters = MetadataFilters(
-                filters=[MetadataFilter(key="case_id", value=case_id, operator=FilterOperator.EQ)]
-            )
-        
-        # Use CitationQueryEngine for answers with citations
-        citation_query_engine = CitationQueryEngine.from_args(
-            self.index,
-            similarity_top_k=7,  # Get more results before reranking
-            citation_chunk_size=512,
-            node_postprocessors=node_postprocessors,
-            filters=filters
+    def _case_filter(self, case_id: Optional[int]) -> Optional[models.Filter]:
+        if case_id is None:
+            return None
+        return models.Filter(
+            must=[
+                models.FieldCondition(
+                    key="case_id",
+                    match=models.MatchValue(value=case_id)
+                )
+            ]
         )
+
+    def _retrieve(self, query: str, case_id: int = None, limit: int = 7, query_embedding: Optional[np.ndarray] = None) -> List[NodeWithScore]:
+        """
+        Search Qdrant directly for the chunks closest to the query.
+        """
+        if query_embedding is None:
+            query_embedding = embed_query(query)
+        points = self.client.query_points(
+            collection_name=self.collection_name,
+            query=query_embedding,
+            query_filter=self._case_filter(case_id),
+            search_params=QUANTIZED_SEARCH_PARAMS,
+            limit=limit,
+            with_payload=True
+        ).points
+        nodes = []
+        for point in points:
+            payload = dict(point.payload or {})
+            text = payload.pop("text", "")
+            nodes.append(NodeWithScore(node=TextNode(id_=str(point.id), text=text, metadata=payload), score=point.score))
+        return nodes
+
+    def _answer_messages(self, query: str, nodes: List[NodeWithScore]) -> List[dict]:
+        sources = "\n\n".join(f"Source {i}:\n{node.node.get_content()}" for i, node in enumerate(nodes, start=1))
+        return [
+            {"role": "system", "content": CITATION_SYSTEM_PROMPT},
+            {"role": "user", "content": f"{sources}\n\nQuery: {query}\nAnswer:"}
+        ]
+
+    def _answer(self, query: str, nodes: List[NodeWithScore]) -> str:
+        """
+        Answer the query from the retrieved chunks with a single LLM call.
+        """
+        return self.llm.generate_response(self._answer_messages(query, nodes))
+
+    def _retrieve_with_citations(
+        self,
+        query: str,
+        case_id: int = None,
+        query_embedding: Optional[np.ndarray] = None,
+        candidates: Optional[List[NodeWithScore]] = None
+    ) -> Tuple[List[NodeWithScore], dict]:
+        """
+        Retrieve and rerank the chunks for a query. Pass candidates to rerank
+        chunks that were already retrieved instead of searching again.
+
+        Returns:
+            (chunks to answer from, result dict with everything but the answer)
+        """
+        # Retrieve more results than needed before reranking
+        nodes = candidates if candidates is not None else self._retrieve(query, case_id, limit=RETRIEVAL_LIMIT, query_embedding=query_embedding)
+        if self.reranker:
+            nodes = self.reranker.postprocess_nodes(nodes, query_str=query)
+        top_nodes = nodes[:self.reranker_config["top_n"]]
         
-        response = citation_query_engine.query(query)
         citations = []
-        for i, node in enumerate(response.source_nodes[:self.reranker_config["top_n"]]):
+        for i, node in enumerate(top_nodes):
             meta = node.node.metadata
             citation = {
                 "source": meta.get("file_name", f"chunk_{i+1}"),
-                "text": node.node.get_text()
+                "text": node.node.get_content()
             }
             # Add case_id to citation if present
             if "case_id" in meta:
                 citation["case_id"] = meta["case_id"]
             # Add reranking score if available
-            if hasattr(node, 'score') and node.score is not None:
+            if node.score is not None:
                 citation["score"] = node.score
-                citation["reranked"] = True
+                citation["reranked"] = self.reranker is not None
             citations.append(citation)
         
         result = {
-            "answer": str(response), 
             "citations": citations,
-            "retrieved_chunks": len(response.source_nodes),
+            "retrieved_chunks": len(nodes),
             "case_id_filter": case_id
         }
         
@@ -93,39 +165,106 @@ class RAGEngine:
             result["reranker_top_n"] = self.reranker_config['top_n']
         else:
             result["reranker_used"] = "none"
+        return top_nodes, result
+
+    def query(self, query: str, case_id: int = None) -> dict:
+        # Answer repeated and near-duplicate questions from the semantic cache
+        cache = get_semantic_cache("rag", self.collection_name)
+        query_embedding = None
+        if cache is not None:
+            cached, query_embedding = cache.get(query, case_id)
+            if cached is not None:
+                return cached
         
+        # Reuse the embedding computed for the cache lookup
+        nodes, result = self._retrieve_with_citations(query, case_id, query_embedding)
+        result = {"answer": self._answer(query, nodes), **result}
+        
+        if cache is not None:
+            cache.put(query, case_id, result, query_embedding)
         return result
 
-    def query_without_reranker(self, query: str, case_id: int = None) -> dict:
+    def query_stream(self, query: str, case_id: int = None) -> Iterator[Tuple[str, dict]]:
         """
-        Query method that bypasses reranking for comparison purposes.
+        Like query(), but yields the answer while the LLM generates it.
+
+        Yields:
+            ("citations", result without the answer) once retrieval is done, then
+            ("chunk", {"delta": text}) per generated piece of the answer, and
+            finally ("complete", full result as returned by query())
         """
-        filters = None
-        if case_id is not None:
-            filters = MetadataFilters(
-                filters=[MetadataFilter(key="case_id", value=case_id, operator=FilterOperator.EQ)]
-            )
+        cache = get_semantic_cache("rag", self.collection_name)
+        query_embedding = None
+        if cache is not None:
+            cached, query_embedding = cache.get(query, case_id)
+            if cached is not None:
+                yield "citations", {key: value for key, value in cached.items() if key != "answer"}
+                yield "chunk", {"delta": cached["answer"]}
+                yield "complete", cached
+                return
         
-        # Use CitationQueryEngine without any postprocessors
-        citation_query_engine = CitationQueryEngine.from_args(
-            self.index,
-            similarity_top_k=3,
-            citation_chunk_size=512,
-            filters=filters
-        )
+        nodes, result = self._retrieve_with_citations(query, case_id, query_embedding)
+        yield "citations", result
+        parts = []
+        for delta in self.llm.stream_response(self._answer_messages(query, nodes)):
+            parts.append(delta)
+            yield "chunk", {"delta": delta}
+        result = {"answer": "".join(parts), **result}
         
-        response = citation_query_engine.query(query)
+        if cache is not None:
+            cache.put(query, case_id, result, query_embedding)
+        yield "complete", result
+
+    def find_similar(self, point_id: str, case_id: int = None, limit: int = 7) -> dict:
+        """
+        Find chunks similar to an already stored chunk, using Qdrant's recommend query.
+
+        Qdrant looks up the stored vector itself, so no separate fetch of the
+        point's vector is needed before searching.
+        """
+        points = self.client.query_points(
+            collection_name=self.collection_name,
+            query=models.RecommendQuery(recommend=models.RecommendInput(positive=[point_id])),
+            query_filter=self._case_filter(case_id),
+            search_params=QUANTIZED_SEARCH_PARAMS,
+            limit=limit,
+            with_payload=True
+        ).points
+        citations = []
+        for i, point in enumerate(points):
+            payload = point.payload or {}
+            citation = {
+                "source": payload.get("file_name", f"chunk_{i+1}"),
+                "text": payload.get("text", ""),
+                "score": point.score
+            }
+            if "case_id" in payload:
+                citation["case_id"] = payload["case_id"]
+            citations.append(citation)
+        return {
+            "answer": "",
+            "citations": citations,
+            "retrieved_chunks": len(points),
+            "case_id_filter": case_id
+        }
+
+    def query_without_reranker(self, query: str, case_id: int = None, candidates: Optional[List[NodeWithScore]] = None) -> dict:
+        """
+        Query method that bypasses reranking for comparison purposes. Pass
+        candidates to answer from already retrieved chunks (the top 3 are used).
+        """
+        nodes = candidates[:3] if candidates is not None else self._retrieve(query, case_id, limit=3)
         citations = []
-        for i, node in enumerate(response.source_nodes):
+        for i, node in enumerate(nodes):
             meta = node.node.metadata
             citations.append({
                 "source": meta.get("file_name", f"chunk_{i+1}"),
-                "text": node.node.get_text()[:200],
+                "text": node.node.get_content()[:200],
                 "reranked": False
             })
         
         return {
-            "answer": str(response), 
+            "answer": self._answer(query, nodes),
             "citations": citations,
             "reranker_used": "none (bypassed)"
         }
@@ -137,11 +276,19 @@ class RAGEngine:
         if not self.reranker:
             return {"error": "Reranker not available for comparison"}
         
-        # Get results with reranker
-        with_reranker = self.query(query)
+        # Search once; both branches start from the same candidates, and the
+        # unreranked one uses the top of the same ranking a limit=3 search returns
+        candidates = self._retrieve(query, limit=RETRIEVAL_LIMIT)
+        
+        def answer_with_reranker() -> dict:
+            nodes, result = self._retrieve_with_citations(query, candidates=candidates)
+            return {"answer": self._answer(query, nodes), **result}
         
-        # Get results without reranker
-        without_reranker = self.query_without_reranker(query)
+        # The two LLM calls are independent, so run them at the same time
+        with ThreadPoolExecutor(max_workers=1) as executor:
+            with_reranker_future = executor.submit(answer_with_reranker)
+            without_reranker = self.query_without_reranker(query, candidates=candidates)
+            with_reranker = with_reranker_future.result()
         
         return {
             "query": query,
@@ -150,22 +297,13 @@ class RAGEngine:
             "reranker_config": self.reranker_config
         } 
 
-    def get_chunks_by_case_id(self, case_id: int, limit: int = 1000):
+    def _scroll_range(self, scroll_filter: Optional[models.Filter], start: Optional[str], end: Optional[int], limit: int) -> List:
         """
-        Retrieve all chunks (points) for a given case_id from Qdrant.
-        Returns a list of dicts with 'text' and 'metadata'.
+        Scroll the points from id start up to (excluding) the UUID with value end.
+        Qdrant returns scroll pages in id order: integer ids first, then UUIDs by value.
         """
-        from qdrant_client import models
-        scroll_filter = models.Filter(
-            must=[
-                models.FieldCondition(
-                    key="case_id",
-                    match=models.MatchValue(value=case_id)
-                )
-            ]
-        )
-        all_points = []
-        next_page = None
+        results = []
+        next_page = start
         while True:
             points, next_page = self.client.scroll(
                 collection_name=self.collection_name,
@@ -176,11 +314,50 @@ class RAGEngine:
                 offset=next_page
             )
             for point in points:
-                payload = point.payload or {}
-                all_points.append({
-                    "text": payload.get("text", ""),
-                    "metadata": payload
-                })
-            if not next_page:
-                break
-        return all_points 
\ No newline at end of file
+                if end is not None and _uuid_value(point.id) >= end:
+                    return results
+                results.append(point)
+            if not next_page or (end is not None and _uuid_value(next_page) >= end):
+                return results
+
+    def get_chunks_by_case_id(self, case_id: int, limit: int = 1000):
+        """
+        Retrieve all chunks (points) for a given case_id from Qdrant.
+        Returns a list of dicts with 'text' and 'metadata' (the rest of the payload).
+
+        Large cases are scrolled in SCROLL_PARTITIONS id ranges at once instead of
+        one page after another; chunk ids are random UUIDs, so the ranges are
+        about equally full.
+        """
+        scroll_filter = self._case_filter(case_id)
+        count = self.client.count(collection_name=self.collection_name, count_filter=scroll_filter, exact=False).count
+        if count <= PARALLEL_SCROLL_THRESHOLD:
+            points = self._scroll_range(scroll_filter, None, None, limit)
+        else:
+            step = 2 ** 128 // SCROLL_PARTITIONS
+            bounds = [k * step for k in range(1, SCROLL_PARTITIONS)]
+            # The first range starts at the beginning, so it also covers integer ids
+            starts = [None] + [str(uuid.UUID(int=bound)) for bound in bounds]
+            ends = bounds + [None]
+            with ThreadPoolExecutor(max_workers=SCROLL_PARTITIONS) as executor:
+                ranges = executor.map(lambda start, end: self._scroll_range(scroll_filter, start, end, limit), starts, ends)
+                points = [point for range_points in ranges for point in range_points]
+        all_points = []
+        for point in points:
+            payload = point.payload or {}
+            # The text is not repeated inside the metadata
+            all_points.append({
+                "text": payload.pop("text", ""),
+                "metadata": payload
+            })
+        return all_points
+
+def _uuid_value(point_id) -> int:
+    # Integer ids sort before every UUID
+    return -1 if isinstance(point_id, int) else uuid.UUID(str(point_id)).int
+
+# Centralized singleton RAGEngine instance
+def get_rag_engine() -> RAGEngine:
+    if not hasattr(get_rag_engine, "_instance"):
+        get_rag_engine._instance = RAGEngine(collection_name="law-test")
+    return get_rag_engine._instance
@@ -1,18 +1,103 @@
 """
 Reranker module for improving search result relevance using various reranking strategies.
-Supports Cohere Rerank and other reranking methods.
+Supports Cohere Rerank and a local ONNX cross-encoder.
 """
 
+import hashlib
 import os
-from typing import Optional, List, Any
+import threading
+from collections import OrderedDict
+from typing import Optional, List, Any, Tuple
 from dotenv import load_dotenv
+from llama_index.core.schema import NodeWithScore
+
+# Candidates the wrapped Cohere reranker may return; above any retrieval limit, so
+# every candidate it is given gets a score that can be cached
+_COHERE_MAX_TOP_N = 100
+
+class CachedReranker:
+    """
+    Reranker wrapper that remembers the score of every (query, chunk) pair.
+
+    The wrapped reranker must score all nodes it is given. Repeated or retried
+    questions (compared after lowercasing and collapsing whitespace) only send
+    the chunks that were not scored before, and skip the rerank call entirely
+    when all of them were.
+    """
+
+    def __init__(self, inner: Any, top_n: int, maxsize: int = 10_000):
+        self.inner = inner
+        self.top_n = top_n
+        self.maxsize = maxsize
+        # (query hash, node id) -> score, least recently used first
+        self._scores: "OrderedDict[Tuple[bytes, str], float]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def postprocess_nodes(self, nodes: List[NodeWithScore], query_str: str) -> List[NodeWithScore]:
+        query_key = hashlib.sha256(" ".join(query_str.lower().split()).encode()).digest()
+        scored, missing = [], []
+        with self._lock:
+            for node in nodes:
+                key = (query_key, node.node.node_id)
+                score = self._scores.get(key)
+                if score is None:
+                    missing.append(node)
+                    continue
+                self._scores.move_to_end(key)
+                scored.append(NodeWithScore(node=node.node, score=score))
+        if missing:
+            reranked = self.inner.postprocess_nodes(missing, query_str=query_str)
+            with self._lock:
+                for node in reranked:
+                    if node.score is not None:
+                        self._scores[(query_key, node.node.node_id)] = node.score
+                while len(self._scores) > self.maxsize:
+                    self._scores.popitem(last=False)
+            scored.extend(reranked)
+        scored.sort(key=lambda node: node.score or 0.0, reverse=True)
+        return scored[:self.top_n]
+
+# Hugging Face id or local directory of an ONNX export (e.g. an int8-quantized one)
+DEFAULT_LOCAL_RERANKER_MODEL = "cross-encoder/ms-marco-MiniLM-L-6-v2"
+
+class OnnxCrossEncoderReranker:
+    """
+    Local cross-encoder reranker run with ONNX Runtime, so reranking needs no
+    network round-trip. All (query, chunk) pairs are scored in one padded batch.
+    """
+
+    def __init__(self, model_name: str, top_n: int, max_length: int = 512):
+        from optimum.onnxruntime import ORTModelForSequenceClassification
+        from transformers import AutoTokenizer
+
+        self.top_n = top_n
+        self.max_length = max_length
+        self.tokenizer = AutoTokenizer.from_pretrained(model_name)
+        # Directories are expected to hold an existing ONNX export; hub models are
+        # converted on load
+        self.model = ORTModelForSequenceClassification.from_pretrained(model_name, export=not os.path.isdir(model_name))
+
+    def postprocess_nodes(self, nodes: List[NodeWithScore], query_str: str) -> List[NodeWithScore]:
+        if not nodes:
+            return []
+        inputs = self.tokenizer(
+            [query_str] * len(nodes),
+            [node.node.get_content() for node in nodes],
+            padding="longest",
+            truncation=True,
+            max_length=self.max_length,
+            return_tensors="np"
+        )
+        scores = self.model(**inputs).logits.reshape(-1)
+        ranked = sorted(zip(nodes, scores), key=lambda pair: pair[1], reverse=True)
+        return [NodeWithScore(node=node.node, score=float(score)) for node, score in ranked[:self.top_n]]
 
 def get_reranker(provider: str = "cohere", top_n: int = 3) -> Optional[Any]:
     """
     Factory function to get a configured reranker based on the provider.
     
     Args:
-        provider: Reranking provider ("cohere", "none")
+        provider: Reranking provider ("cohere", "onnx_minilm", "none")
         top_n: Number of top results to return after reranking
         
     Returns:
@@ -38,7 +123,7 @@ def get_reranker(provider: str = "cohere", top_n: int = 3) -> Optional[Any]:
                     "Get your API key from https://dashboard.cohere.ai/api-keys"
                 )
             
-            return CohereRerank(api_key=api_key, top_n=top_n)
+            return CachedReranker(CohereRerank(api_key=api_key, top_n=_COHERE_MAX_TOP_N), top_n=top_n)
             
         except ImportError:
             raise ImportError(
@@ -46,6 +131,15 @@ def get_reranker(provider: str = "cohere", top_n: int = 3) -> Optional[Any]:
                 "pip install llama-index-postprocessor-cohere-rerank"
             )
     
+    elif provider.lower() == "onnx_minilm":
+        try:
+            return OnnxCrossEncoderReranker(os.getenv("RERANKER_MODEL", DEFAULT_LOCAL_RERANKER_MODEL), top_n=top_n)
+        except ImportError:
+            raise ImportError(
+                "Local reranker not installed. Install with: "
+                "pip install optimum[onnxruntime]"
+            )
+    
     else:
         raise ValueError(f"Unsupported reranker provider: {provider}")
 
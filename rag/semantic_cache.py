@@ -0,0 +1,198 @@
+"""
+Semantic response cache for RAG and agent answers.
+
+Answers are stored in a separate Qdrant collection keyed by the embedding of
+the question. A later question whose embedding is within SEMANTIC_CACHE_THRESHOLD
+(cosine similarity) of a cached one, for the same case and document collection,
+is answered from the
+cache instead of running retrieval and the LLM again. Exact repeats are served
+from a small in-process map without embedding the question at all.
+
+Configure via environment variables (see settings.py):
+- SEMANTIC_CACHE_ENABLED=true
+- SEMANTIC_CACHE_THRESHOLD=0.95
+- SEMANTIC_CACHE_TTL_SECONDS=86400
+"""
+
+import copy
+import logging
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+import numpy as np
+from qdrant_client import models
+from rag.qdrant_client_factory import get_qdrant_client, create_collection_if_not_exists
+from rag.embedder import embed_query
+from settings import SEMANTIC_CACHE_ENABLED, SEMANTIC_CACHE_THRESHOLD, SEMANTIC_CACHE_TTL_SECONDS
+
+logger = logging.getLogger(__name__)
+
+SEMANTIC_CACHE_COLLECTION = "rag_cache"
+SEMANTIC_CACHE_PAYLOAD_INDEXES = {
+    "scope": models.PayloadSchemaType.KEYWORD,
+    "ts": models.PayloadSchemaType.FLOAT
+}
+
+class SemanticCache:
+    """
+    Cache of answers for one kind of result ("rag" or "agent") answered from one
+    document collection, scoped per case. Cache failures are logged and treated
+    as misses, never raised to the caller.
+    """
+
+    def __init__(
+        self,
+        kind: str,
+        source: str,
+        collection: str = SEMANTIC_CACHE_COLLECTION,
+        threshold: float = SEMANTIC_CACHE_THRESHOLD,
+        ttl_s: int = SEMANTIC_CACHE_TTL_SECONDS,
+        exact_maxsize: int = 1024
+    ):
+        self.kind = kind
+        self.source = source
+        self.collection = collection
+        self.threshold = threshold
+        self.ttl_s = ttl_s
+        self.exact_maxsize = exact_maxsize
+        # (scope, question) -> (expires_at, result), least recently used first
+        self._exact: "OrderedDict[Tuple[str, str], Tuple[float, Dict[str, Any]]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _ensure_collection(self):
+        # The lookup sits in front of every query, so the (small) cache collection
+        # keeps its vectors and payloads in RAM, unquantized
+        create_collection_if_not_exists(
+            self.collection,
+            payload_indexes=SEMANTIC_CACHE_PAYLOAD_INDEXES,
+            quantize=False,
+            on_disk_payload=False
+        )
+
+    def _scope(self, case_id: Optional[int]) -> str:
+        prefix = f"{self.kind}:{self.source}"
+        return f"{prefix}:all" if case_id is None else f"{prefix}:case:{case_id}"
+
+    def _get_exact(self, key: Tuple[str, str]) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            entry = self._exact.get(key)
+            if entry is None:
+                return None
+            if entry[0] < time.time():
+                del self._exact[key]
+                return None
+            self._exact.move_to_end(key)
+            # Copies in and out, so callers cannot change the cached result
+            return copy.deepcopy(entry[1])
+
+    def _set_exact(self, key: Tuple[str, str], result: Dict[str, Any]):
+        with self._lock:
+            self._exact[key] = (time.time() + self.ttl_s, copy.deepcopy(result))
+            self._exact.move_to_end(key)
+            while len(self._exact) > self.exact_maxsize:
+                self._exact.popitem(last=False)
+
+    def get(self, question: str, case_id: Optional[int] = None) -> Tuple[Optional[Dict[str, Any]], Optional[np.ndarray]]:
+        """
+        Look up a cached result for the question.
+
+        Returns:
+            (cached result or None, question embedding or None). The embedding is
+            returned on a semantic miss so the caller can reuse it for retrieval
+            and pass it back to put().
+        """
+        key = (self._scope(case_id), question.strip())
+        cached = self._get_exact(key)
+        if cached is not None:
+            return cached, None
+        try:
+            vector = embed_query(question)
+            self._ensure_collection()
+            points = get_qdrant_client().query_points(
+                collection_name=self.collection,
+                query=vector,
+                query_filter=models.Filter(must=[
+                    models.FieldCondition(key="scope", match=models.MatchValue(value=key[0])),
+                    models.FieldCondition(key="ts", range=models.Range(gte=time.time() - self.ttl_s))
+                ]),
+                score_threshold=self.threshold,
+                limit=1,
+                with_payload=True
+            ).points
+        except Exception as e:
+            logger.warning(f"Semantic cache lookup failed: {e}")
+            return None, None
+        if not points:
+            return None, vector
+        result = points[0].payload["result"]
+        self._set_exact(key, result)
+        return result, vector
+
+    def put(self, question: str, case_id: Optional[int], result: Dict[str, Any], vector: Optional[np.ndarray] = None):
+        """
+        Store a result for the question, embedding it unless vector is given.
+        """
+        scope = self._scope(case_id)
+        self._set_exact((scope, question.strip()), result)
+        try:
+            if vector is None:
+                vector = embed_query(question)
+            self._ensure_collection()
+            get_qdrant_client().upsert(
+                collection_name=self.collection,
+                points=[models.PointStruct(
+                    id=str(uuid.uuid4()),
+                    # PointStruct validates plain lists only
+                    vector=vector.tolist(),
+                    payload={"scope": scope, "question": question, "case_id": case_id, "ts": time.time(), "result": result}
+                )]
+            )
+        except Exception as e:
+            logger.warning(f"Semantic cache write failed: {e}")
+
+    def invalidate(self, case_id: Optional[int] = None):
+        """
+        Drop cached results for a case, plus the unscoped ones, which may have
+        been answered from the same documents.
+        """
+        scopes = [self._scope(None)] if case_id is None else [self._scope(case_id), self._scope(None)]
+        with self._lock:
+            for key in [key for key in self._exact if key[0] in scopes]:
+                del self._exact[key]
+        try:
+            self._ensure_collection()
+            get_qdrant_client().delete(
+                collection_name=self.collection,
+                points_selector=models.FilterSelector(filter=models.Filter(must=[
+                    models.FieldCondition(key="scope", match=models.MatchAny(any=scopes))
+                ]))
+            )
+        except Exception as e:
+            logger.warning(f"Semantic cache invalidation failed: {e}")
+
+_caches: Dict[Tuple[str, str], SemanticCache] = {}
+_caches_lock = threading.Lock()
+
+def get_semantic_cache(kind: str, source: str) -> Optional[SemanticCache]:
+    """
+    Get the shared cache for a kind of result answered from the document
+    collection source, or None if the cache is disabled.
+    """
+    if not SEMANTIC_CACHE_ENABLED:
+        return None
+    with _caches_lock:
+        if (kind, source) not in _caches:
+            _caches[(kind, source)] = SemanticCache(kind, source)
+        return _caches[(kind, source)]
+
+def invalidate_case(case_id: Optional[int], source: str):
+    """
+    Drop every kind of cached result that may depend on the documents of a case
+    in the document collection source.
+    """
+    for kind in ("rag", "agent"):
+        cache = get_semantic_cache(kind, source)
+        if cache is not None:
+            cache.invalidate(case_id)
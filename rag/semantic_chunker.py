@@ -1,5 +1,5 @@
 from llama_index.core.node_parser import SemanticSplitterNodeParser
-from llama_index.embeddings.openai import OpenAIEmbedding
+from rag.embedder import CachedEmbedding
 import os
 
 
@@ -19,7 +19,9 @@ def semantic_chunk_documents(documents, buffer_size=1, breakpoint_percentile_thr
     if not os.getenv("OPENAI_API_KEY"):
         raise EnvironmentError("OPENAI_API_KEY must be set in the environment.")
 
-    embed_model = OpenAIEmbedding(model="text-embedding-3-large", dimensions=3072)
+    # Sentence groups of the whole document are embedded in concurrent batches of
+    # EMBED_BATCH_SIZE, and groups seen before come from the embedding cache
+    embed_model = CachedEmbedding()
     splitter = SemanticSplitterNodeParser(
         buffer_size=buffer_size,
         breakpoint_percentile_threshold=breakpoint_percentile_threshold,
@@ -3,15 +3,17 @@ Streaming callback system for CrewAI agents to enable real-time streaming of age
 """
 
 from typing import List, Dict, Any, Optional, Callable
-import json
 import time
+import orjson
 import asyncio
-from queue import Queue
+from collections import deque
 import threading
-from dataclasses import dataclass, asdict
+from dataclasses import dataclass, fields
 from datetime import datetime
 
-@dataclass
+# slots=True drops the per-instance __dict__; orjson and ormsgpack serialize the
+# slots directly, so sending an event never builds an intermediate dict
+@dataclass(slots=True)
 class StreamingEvent:
     """Standardized event structure for streaming"""
     type: str
@@ -25,6 +27,8 @@ class StreamingEvent:
     error: Optional[str] = None
     metadata: Optional[Dict[str, Any]] = None
 
+_EVENT_FIELDS = fields(StreamingEvent)
+
 class StreamingCallback:
     """
     Custom CrewAI callback that captures all agent events and queues them for streaming.
@@ -32,20 +36,22 @@ class StreamingCallback:
     """
     
     def __init__(self, event_callback: Optional[Callable[[StreamingEvent], None]] = None):
-        self.events = Queue()
+        # deque.append / popleft are atomic, so emitting an event takes no lock;
+        # _wake only wakes up a get_events() consumer waiting for the next one
+        self.events = deque()
+        self._wake = threading.Event()
         self.event_callback = event_callback
         self.thinking_buffer = []
-        self._lock = threading.Lock()
     
     def _emit_event(self, event: StreamingEvent):
         """Emit an event to the queue and callback if provided"""
-        with self._lock:
-            self.events.put(event)
-            if self.event_callback:
-                try:
-                    self.event_callback(event)
-                except Exception as e:
-                    print(f"Error in event callback: {e}")
+        self.events.append(event)
+        self._wake.set()
+        if self.event_callback:
+            try:
+                self.event_callback(event)
+            except Exception as e:
+                print(f"Error in event callback: {e}")
     
     def _create_event(self, event_type: str, **kwargs) -> StreamingEvent:
         """Create a standardized event"""
@@ -187,36 +193,37 @@ class StreamingCallback:
     
     # Utility methods
     def get_events(self):
-        """Generator to yield events as they come"""
+        """Generator to yield events as they come, until none arrives for 0.1s"""
         while True:
             try:
-                event = self.events.get(timeout=0.1)
-                yield event
-            except:
-                break
+                yield self.events.popleft()
+            except IndexError:
+                self._wake.clear()
+                # An event appended before the clear() would not wake us up
+                if self.events:
+                    continue
+                if not self._wake.wait(0.1):
+                    break
     
     def get_all_events(self) -> List[StreamingEvent]:
         """Get all events currently in the queue"""
         events = []
-        while not self.events.empty():
+        while True:
             try:
-                events.append(self.events.get_nowait())
-            except:
+                events.append(self.events.popleft())
+            except IndexError:
                 break
         return events
     
     def clear_events(self):
         """Clear all events from the queue"""
-        while not self.events.empty():
-            try:
-                self.events.get_nowait()
-            except:
-                break
+        self.events.clear()
     
     def event_to_dict(self, event: StreamingEvent) -> Dict[str, Any]:
         """Convert event to dictionary for JSON serialization"""
-        return asdict(event)
+        # Shallow: asdict() deep-copies every nested input/output dict
+        return {field.name: getattr(event, field.name) for field in _EVENT_FIELDS}
     
     def event_to_json(self, event: StreamingEvent) -> str:
         """Convert event to JSON string"""
-        return json.dumps(self.event_to_dict(event), default=str) 
\ No newline at end of file
+        return orjson.dumps(event, default=str).decode() 
\ No newline at end of file
@@ -0,0 +1,44 @@
+"""
+Per-document summaries for summary-augmented chunking.
+
+Every chunk of a document is embedded together with a short summary of the
+whole document, so a chunk still matches questions about its document's
+context (parties, subject, type of filing) after it has been cut out of it.
+The stored chunk text stays unchanged, so prompts don't repeat the summary
+once per retrieved chunk.
+"""
+
+import logging
+from typing import Optional
+from rag.llm_provider import get_llm_provider
+
+logger = logging.getLogger(__name__)
+
+# Characters of the document sent to the LLM for the summary
+SUMMARY_INPUT_CHARS = 8000
+
+SUMMARY_PROMPT = "Fasse dieses juristische Dokument in höchstens 100 Wörtern zusammen. Nenne Dokumentart, Parteien und Gegenstand:\n\n{text}"
+
+def summarize_document(text: str) -> Optional[str]:
+    """
+    Summarize a document in about 100 words, or return None if that fails;
+    chunks are then embedded without a summary.
+    """
+    if not text.strip():
+        return None
+    try:
+        return get_llm_provider().generate_response(
+            [{"role": "user", "content": SUMMARY_PROMPT.format(text=text[:SUMMARY_INPUT_CHARS])}],
+            max_tokens=200
+        ).strip()
+    except Exception as e:
+        logger.warning(f"Document summary failed, embedding chunks without it: {e}")
+        return None
+
+def summary_augmented_text(text: str, summary: Optional[str]) -> str:
+    """
+    Text that is embedded for a chunk: the document summary followed by the chunk.
+    """
+    if not summary:
+        return text
+    return f"[ZUSAMMENFASSUNG]\n{summary}\n[ABSCHNITT]\n{text}"
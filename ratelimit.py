@@ -2,15 +2,17 @@ from slowapi import Limiter, _rate_limit_exceeded_handler
 from slowapi.util import get_remote_address
 from slowapi.errors import RateLimitExceeded
 from starlette.requests import Request
-import os
-
-HOURLY_RATE_LIMIT = os.getenv("HOURLY_RATE_LIMIT", "50/hour")
-DAILY_RATE_LIMIT = os.getenv("DAILY_RATE_LIMIT", "200/day")
-GLOBAL_DAILY_LIMIT = os.getenv("GLOBAL_DAILY_LIMIT", "500/day")
+from settings import HOURLY_RATE_LIMIT, DAILY_RATE_LIMIT, GLOBAL_DAILY_LIMIT, RATELIMIT_STORAGE_URL
 
 limiter = Limiter(
     key_func=get_remote_address,
-    default_limits=[HOURLY_RATE_LIMIT, DAILY_RATE_LIMIT]
+    default_limits=[HOURLY_RATE_LIMIT, DAILY_RATE_LIMIT],
+    # With Redis storage each hit is one atomic INCR + EXPIRE, so every worker and
+    # replica counts against the same limits (including the one "global" key)
+    storage_uri=RATELIMIT_STORAGE_URL,
+    key_prefix="ratelimit",
+    # Keep limiting per process instead of failing requests while Redis is down
+    in_memory_fallback_enabled=True
 )
 
 def global_key_func(request: Request):
@@ -0,0 +1,58 @@
+"""
+Application settings, read once from the environment (and .env) at import time.
+
+Import values from here instead of calling load_dotenv() / os.getenv() in
+individual modules.
+"""
+
+import os
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Database
+DATABASE_CONNECTION_STRING = os.getenv("DATABASE_CONNECTION_STRING")
+DB_SCHEMA = os.getenv("DB_SCHEMA", "schneider-poc")
+DB_POOL_MIN_CONN = int(os.getenv("DB_POOL_MIN_CONN", "5"))
+DB_POOL_MAX_CONN = int(os.getenv("DB_POOL_MAX_CONN", "20"))
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "30"))
+
+# Qdrant
+QDRANT_HOST = os.getenv("QDRANT_HOST")
+QDRANT_API_KEY = os.getenv("QDRANT_API_KEY")
+# Vector quantization for new collections: "binary", "int8" or "none"
+QDRANT_QUANTIZATION = os.getenv("QDRANT_QUANTIZATION", "binary").lower()
+
+# Embed every chunk together with a summary of its document (rag/summarizer.py)
+SUMMARY_AUGMENTED_CHUNKING = os.getenv("SUMMARY_AUGMENTED_CHUNKING", "true").lower() == "true"
+
+# Embedding vector cache (rag/embedding_cache.py); empty disables it
+EMBEDDING_CACHE_PATH = os.getenv("EMBEDDING_CACHE_PATH", "embedding_cache.sqlite3")
+
+# Semantic answer cache (rag/semantic_cache.py)
+SEMANTIC_CACHE_ENABLED = os.getenv("SEMANTIC_CACHE_ENABLED", "true").lower() == "true"
+SEMANTIC_CACHE_THRESHOLD = float(os.getenv("SEMANTIC_CACHE_THRESHOLD", "0.95"))
+SEMANTIC_CACHE_TTL_SECONDS = int(os.getenv("SEMANTIC_CACHE_TTL_SECONDS", "86400"))
+
+# Worker threads for sync route handlers (Starlette's default is 40)
+THREADPOOL_SIZE = int(os.getenv("THREADPOOL_SIZE", "100"))
+
+# Outgoing WebSocket messages buffered per connection; the oldest are dropped
+# when a slow client falls this far behind
+WS_SEND_QUEUE_SIZE = int(os.getenv("WS_SEND_QUEUE_SIZE", "256"))
+# Streaming events produced within this window are sent as one "batch" frame (0 disables)
+WS_BATCH_WINDOW_SECONDS = float(os.getenv("WS_BATCH_WINDOW_SECONDS", "0.015"))
+
+# Response cache (disabled when REDIS_URL is unset)
+REDIS_URL = os.getenv("REDIS_URL")
+CACHE_TTL_SECONDS = int(os.getenv("CACHE_TTL_SECONDS", "60"))
+
+# Rate limiting; counters live in Redis (shared by all workers) when a URL is set,
+# otherwise in the memory of each worker process
+RATELIMIT_STORAGE_URL = os.getenv("RATELIMIT_STORAGE_URL", REDIS_URL or "memory://")
+HOURLY_RATE_LIMIT = os.getenv("HOURLY_RATE_LIMIT", "50/hour")
+DAILY_RATE_LIMIT = os.getenv("DAILY_RATE_LIMIT", "200/day")
+GLOBAL_DAILY_LIMIT = os.getenv("GLOBAL_DAILY_LIMIT", "500/day")
+
+# CORS
+CORS_ALLOWED_ORIGINS = [origin.strip() for origin in os.getenv("CORS_ALLOWED_ORIGINS", "*").split(",")]
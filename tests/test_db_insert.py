@@ -19,8 +19,10 @@ table_statements = [
     CREATE TABLE IF NOT EXISTS person (
         id SERIAL PRIMARY KEY,
         name VARCHAR(255) NOT NULL,
+        lastname VARCHAR(255) NOT NULL DEFAULT '',
         contact_info TEXT,
         legal_representative_id INTEGER,
+        role VARCHAR(20) CHECK (role IN ('plaintiff', 'defendant')),
         FOREIGN KEY (legal_representative_id) REFERENCES person(id)
     );
     ''',
@@ -99,15 +101,15 @@ def sample_data(cur):
         DELETE FROM "case" WHERE name = 'Case A';
     """)
     cur.execute("""
-        DELETE FROM person WHERE name IN ('Alice Smith', 'Bob Johnson', 'Carol Lawyer');
+        DELETE FROM person WHERE (name, lastname) IN (('Alice', 'Smith'), ('Bob', 'Johnson'), ('Carol', 'Lawyer'));
     """)
 
     # Insert persons
     cur.execute("""
-        INSERT INTO person (name, contact_info) VALUES
-        ('Alice Smith', 'alice@example.com'),
-        ('Bob Johnson', 'bob@example.com'),
-        ('Carol Lawyer', 'carol.lawyer@example.com')
+        INSERT INTO person (name, lastname, contact_info, role) VALUES
+        ('Alice', 'Smith', 'alice@example.com', 'defendant'),
+        ('Bob', 'Johnson', 'bob@example.com', 'plaintiff'),
+        ('Carol', 'Lawyer', 'carol.lawyer@example.com', NULL)
         RETURNING id;
     """)
     person_ids = [row[0] for row in cur.fetchall()]
@@ -0,0 +1,64 @@
+import io
+from docx import Document as DocxDocument
+from docx.enum.text import WD_BREAK
+from docx.oxml import OxmlElement
+from rag.doc_loader import load_docx_as_documents, _docx_text, _iter_paragraphs
+
+def _write_fixture(path):
+    """
+    Write a .docx with the run content python-docx turns into more than plain
+    text: tabs, line breaks, page breaks, non-breaking hyphens and split runs.
+    """
+    docx = DocxDocument()
+    docx.add_paragraph("Datum:\t31.12.2023")
+    address = docx.add_paragraph("Kanzlei Schneider")
+    address.add_run().add_break()
+    address.add_run("Hauptstraße 1")
+    address.add_run().add_break(WD_BREAK.LINE)
+    address.add_run("12345 Berlin")
+    split = docx.add_paragraph()
+    split.add_run("Abmah")
+    split.add_run("nung").bold = True
+    hyphenated = docx.add_paragraph("Müller")
+    hyphenated.runs[0]._r.append(OxmlElement("w:noBreakHyphen"))
+    hyphenated.add_run("Lüdenscheidt")
+    page = docx.add_paragraph("Seite 1")
+    page.add_run().add_break(WD_BREAK.PAGE)
+    docx.add_paragraph("")
+    docx.add_paragraph("Ende")
+    docx.save(path)
+    return DocxDocument(path)
+
+def test_docx_text_matches_python_docx(tmp_path):
+    path = tmp_path / "fixture.docx"
+    docx = _write_fixture(str(path))
+    expected = "\n".join(paragraph.text for paragraph in docx.paragraphs)
+    assert "Datum:\t31.12.2023" in expected
+    assert "Kanzlei Schneider\nHauptstraße 1\n12345 Berlin" in expected
+
+    # Streaming path, from a path and from a file object
+    assert load_docx_as_documents(file_path=str(path))[0].text == expected
+    with open(path, "rb") as file_obj:
+        assert load_docx_as_documents(file_obj=file_obj)[0].text == expected
+    # python-docx fallback path
+    assert _docx_text(docx) == expected
+
+def test_iter_paragraphs_drops_finished_blocks():
+    w = "http://schemas.openxmlformats.org/wordprocessingml/2006/main"
+    cell = '<w:tc><w:p><w:r><w:t>Zelle</w:t></w:r></w:p></w:tc>'
+    blocks = "".join(
+        f'<w:p><w:r><w:t>Absatz {i}</w:t></w:r></w:p><w:tbl><w:tr>{cell}{cell}</w:tr></w:tbl>'
+        for i in range(50)
+    )
+    xml = f'<w:document xmlns:w="{w}"><w:body>{blocks}<w:sectPr/></w:body></w:document>'
+    texts = []
+    for paragraph in _iter_paragraphs(io.BytesIO(xml.encode())):
+        texts.append("".join(paragraph.itertext()))
+        block = paragraph if paragraph.getparent().tag == f"{{{w}}}body" else next(
+            ancestor for ancestor in paragraph.iterancestors() if ancestor.getparent().tag == f"{{{w}}}body"
+        )
+        body = block.getparent()
+        # At most the previous top-level block is still attached before this one
+        assert body.index(block) <= 1
+    assert len(body) <= 3
+    assert texts == [text for i in range(50) for text in (f"Absatz {i}", "Zelle", "Zelle")]
@@ -0,0 +1,53 @@
+import numpy as np
+from rag.embedding_cache import EmbeddingCache, _SELECT_CHUNK_SIZE
+
+def _fake_embedding(text: str) -> list:
+    rng = np.random.default_rng(sum(text.encode()))
+    return rng.uniform(-1, 1, 8).tolist()
+
+def test_float16_round_trip(tmp_path):
+    path = str(tmp_path / "emb.sqlite3")
+    vector = _fake_embedding("Kündigung")
+    EmbeddingCache(path, "model").get_or_compute("Kündigung", lambda text: vector)
+
+    # A new instance reads the stored float16 blob back
+    cached = EmbeddingCache(path, "model").get_or_compute("Kündigung", lambda text: 1 / 0)
+    assert cached.dtype == np.float32
+    np.testing.assert_allclose(cached, vector, atol=1e-3)
+    np.testing.assert_array_equal(cached, np.asarray(vector, dtype=np.float16).astype(np.float32))
+
+def test_duplicates_are_computed_once(tmp_path):
+    cache = EmbeddingCache(str(tmp_path / "emb.sqlite3"), "model")
+    calls = []
+
+    def compute(texts):
+        calls.append(list(texts))
+        return [_fake_embedding(text) for text in texts]
+
+    # Stripped text is the key, so " a" and "a " are the same entry
+    vectors = cache.get_or_compute_batch(["a", "b", " a", "a "], compute)
+    assert calls == [["a", "b"]]
+    assert vectors.shape == (4, 8)
+    np.testing.assert_array_equal(vectors[0], vectors[2])
+    np.testing.assert_array_equal(vectors[0], vectors[3])
+
+    cache.get_or_compute_batch(["b", "c"], compute)
+    assert calls == [["a", "b"], ["c"]]
+
+def test_lookups_above_sqlite_parameter_limit(tmp_path):
+    cache = EmbeddingCache(str(tmp_path / "emb.sqlite3"), "model")
+    texts = [f"Absatz {i}" for i in range(2 * _SELECT_CHUNK_SIZE + 1)]
+    computed = cache.get_or_compute_batch(texts, lambda missing: [_fake_embedding(text) for text in missing])
+
+    # Reading them all back takes several IN (...) queries
+    cached = cache.get_or_compute_batch(texts, lambda missing: 1 / 0)
+    assert cached.shape == (len(texts), 8)
+    np.testing.assert_array_equal(cached, computed.astype(np.float16).astype(np.float32))
+
+    # A different model name does not see the entries
+    other = EmbeddingCache(str(tmp_path / "emb.sqlite3"), "other-model")
+    assert other.get_or_compute_batch(["Absatz 0"], lambda missing: [[0.0] * 8]).tolist() == [[0.0] * 8]
+
+def test_empty_batch(tmp_path):
+    cache = EmbeddingCache(str(tmp_path / "emb.sqlite3"), "model")
+    assert len(cache.get_or_compute_batch([], lambda missing: 1 / 0)) == 0
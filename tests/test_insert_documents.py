@@ -0,0 +1,64 @@
+import datetime
+from contextlib import contextmanager
+import api.documents
+from api.documents import insert_documents
+
+class FakeCursor:
+    """
+    Answers the three statements of insert_documents, returning the inserted
+    document rows in reverse order as Postgres is allowed to.
+    """
+
+    def __init__(self):
+        self.executed = []
+        self._rows = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def execute(self, sql, params):
+        self.executed.append((sql, params))
+        if "nextval" in sql:
+            self._rows = [(100 + i,) for i in range(params[0])]
+        elif sql.startswith("INSERT INTO document "):
+            _, ids, _, timestamps = params
+            self._rows = list(reversed(list(zip(ids, timestamps))))
+        else:
+            self._rows = []
+
+    def fetchall(self):
+        return self._rows
+
+class FakeConnection:
+    def __init__(self):
+        self.cur = FakeCursor()
+        self.committed = False
+
+    def cursor(self):
+        return self.cur
+
+    def commit(self):
+        self.committed = True
+
+def test_rows_and_fulltexts_are_paired_by_id(monkeypatch):
+    conn = FakeConnection()
+
+    @contextmanager
+    def fake_get_conn():
+        yield conn
+
+    monkeypatch.setattr(api.documents, "get_conn", fake_get_conn)
+    first = datetime.datetime(2024, 1, 1, 9, 0)
+    second = datetime.datetime(2024, 1, 1, 9, 5)
+    rows = insert_documents(7, [("a.docx", "Text A", first), ("b.docx", "Text B", second)])
+
+    assert rows == [(100, first), (101, second)]
+    document_sql, document_params = conn.cur.executed[1]
+    assert document_params == (7, [100, 101], ["a.docx", "b.docx"], [first, second])
+    fulltext_sql, fulltext_params = conn.cur.executed[2]
+    assert "document_fulltext" in fulltext_sql
+    assert fulltext_params == ([100, 101], ["Text A", "Text B"])
+    assert conn.committed
@@ -0,0 +1,44 @@
+from unittest import mock
+import numpy as np
+import rag.qdrant_uploader
+from rag.qdrant_uploader import upload_nodes_to_qdrant
+
+class FakeNode:
+    def __init__(self, text, embedding, metadata=None):
+        self.text = text
+        self.embedding = embedding
+        self.metadata = metadata or {}
+
+    def get_embedding(self):
+        return self.embedding
+
+    def get_content(self):
+        return self.text
+
+def test_upload_nodes_to_qdrant_is_the_grpc_uploader():
+    # There is a single uploader, defined in rag/qdrant_uploader.py
+    assert upload_nodes_to_qdrant.__module__ == "rag.qdrant_uploader"
+
+def test_upload_nodes_to_qdrant_uses_factory_client():
+    client = mock.Mock()
+    nodes = [
+        FakeNode("eins", [0.1, 0.2, 0.3], {"file_name": "a.docx"}),
+        FakeNode("ohne Embedding", None),
+        FakeNode("zwei", np.array([0.4, 0.5, 0.6], dtype=np.float32))
+    ]
+    with mock.patch.object(rag.qdrant_uploader, "get_qdrant_client", return_value=client) as get_client, \
+            mock.patch.object(rag.qdrant_uploader, "create_collection_if_not_exists", return_value=False):
+        upload_nodes_to_qdrant(nodes, collection_name="test-collection", case_id=7, batch_size=64)
+
+    get_client.assert_called_once_with()
+    client.upload_collection.assert_called_once()
+    kwargs = client.upload_collection.call_args.kwargs
+    assert kwargs["collection_name"] == "test-collection"
+    assert kwargs["batch_size"] == 64
+    assert kwargs["vectors"].dtype == np.float32
+    np.testing.assert_allclose(kwargs["vectors"], [[0.1, 0.2, 0.3], [0.4, 0.5, 0.6]], rtol=1e-6)
+    assert kwargs["payload"] == [
+        {"text": "eins", "case_id": 7, "file_name": "a.docx"},
+        {"text": "zwei", "case_id": 7}
+    ]
+    assert len(kwargs["ids"]) == 2
@@ -0,0 +1,59 @@
+import uuid
+from types import SimpleNamespace
+import rag.rag_engine
+from rag.rag_engine import RAGEngine, SCROLL_PARTITIONS
+
+class FakeScrollClient:
+    """
+    Scrolls like Qdrant: points in id order (integer ids first, then UUIDs by
+    value), starting at the offset id, which does not have to exist.
+    """
+
+    def __init__(self, point_ids):
+        self.points = sorted(point_ids, key=self._order)
+
+    @staticmethod
+    def _order(point_id):
+        return (0, point_id) if isinstance(point_id, int) else (1, uuid.UUID(point_id).int)
+
+    def count(self, collection_name, count_filter=None, exact=True):
+        return SimpleNamespace(count=len(self.points))
+
+    def scroll(self, collection_name, scroll_filter=None, limit=10, with_payload=True, with_vectors=False, offset=None):
+        remaining = self.points if offset is None else [
+            point_id for point_id in self.points if self._order(point_id) >= self._order(offset)
+        ]
+        page, rest = remaining[:limit], remaining[limit:]
+        points = [SimpleNamespace(id=point_id, payload={"text": str(point_id), "case_id": 1}) for point_id in page]
+        return points, (rest[0] if rest else None)
+
+def _engine(point_ids):
+    engine = RAGEngine.__new__(RAGEngine)
+    engine.client = FakeScrollClient(point_ids)
+    engine.collection_name = "test"
+    return engine
+
+def _point_ids():
+    step = 2 ** 128 // SCROLL_PARTITIONS
+    ids = [1, 2, 3]
+    for k in range(SCROLL_PARTITIONS):
+        # Points right before, on and after every partition boundary
+        for value in (k * step - 1, k * step, k * step + 1):
+            if 0 <= value < 2 ** 128:
+                ids.append(str(uuid.UUID(int=value)))
+    ids.append(str(uuid.UUID(int=2 ** 128 - 1)))
+    ids.extend(str(uuid.UUID(int=(i * 7919 * 2 ** 100) % 2 ** 128)) for i in range(200))
+    return list(dict.fromkeys(ids))
+
+def test_parallel_scroll_returns_every_point_once(monkeypatch):
+    point_ids = _point_ids()
+    monkeypatch.setattr(rag.rag_engine, "PARALLEL_SCROLL_THRESHOLD", 10)
+    chunks = _engine(point_ids).get_chunks_by_case_id(1, limit=3)
+    texts = [chunk["text"] for chunk in chunks]
+    assert sorted(texts) == sorted(str(point_id) for point_id in point_ids)
+    assert all(chunk["metadata"] == {"case_id": 1} for chunk in chunks)
+
+def test_small_cases_scroll_sequentially():
+    point_ids = _point_ids()
+    chunks = _engine(point_ids).get_chunks_by_case_id(1, limit=7)
+    assert [chunk["text"] for chunk in chunks] == [str(point_id) for point_id in FakeScrollClient(point_ids).points]
@@ -0,0 +1,50 @@
+from llama_index.core.schema import NodeWithScore, TextNode
+from rag.reranker import CachedReranker
+
+class FakeReranker:
+    """Scores a chunk by its text length and records which chunks it was sent."""
+
+    def __init__(self):
+        self.calls = []
+
+    def postprocess_nodes(self, nodes, query_str):
+        self.calls.append([node.node.node_id for node in nodes])
+        return sorted(
+            (NodeWithScore(node=node.node, score=float(len(node.node.get_content()))) for node in nodes),
+            key=lambda node: node.score,
+            reverse=True
+        )
+
+def _nodes(*texts):
+    return [NodeWithScore(node=TextNode(id_=text, text=text), score=0.5) for text in texts]
+
+def test_cached_scores_are_merged_with_fresh_ones():
+    inner = FakeReranker()
+    reranker = CachedReranker(inner, top_n=2)
+    first = reranker.postprocess_nodes(_nodes("aa", "aaaa"), "Frist?")
+    assert [(node.node.node_id, node.score) for node in first] == [("aaaa", 4.0), ("aa", 2.0)]
+
+    # Same query up to case and whitespace: only the new chunk is sent
+    second = reranker.postprocess_nodes(_nodes("aa", "aaaa", "aaa"), "  frist? ")
+    assert inner.calls == [["aa", "aaaa"], ["aaa"]]
+    assert [(node.node.node_id, node.score) for node in second] == [("aaaa", 4.0), ("aaa", 3.0)]
+
+    # All cached: no rerank call at all
+    reranker.postprocess_nodes(_nodes("aaa", "aa"), "Frist?")
+    assert len(inner.calls) == 2
+
+    # Another query does not reuse the scores
+    reranker.postprocess_nodes(_nodes("aa"), "Kündigung?")
+    assert inner.calls[-1] == ["aa"]
+
+def test_least_recently_used_scores_are_evicted():
+    inner = FakeReranker()
+    reranker = CachedReranker(inner, top_n=3, maxsize=2)
+    reranker.postprocess_nodes(_nodes("a", "bb"), "q")
+    # Touch "a" so "bb" is the least recently used entry
+    reranker.postprocess_nodes(_nodes("a"), "q")
+    reranker.postprocess_nodes(_nodes("ccc"), "q")
+    assert inner.calls == [["a", "bb"], ["ccc"]]
+
+    reranker.postprocess_nodes(_nodes("a", "bb", "ccc"), "q")
+    assert inner.calls[-1] == ["bb"]
@@ -0,0 +1,67 @@
+import asyncio
+import orjson
+import ormsgpack
+from api.websocket import ConnectionManager, encode_batch, encode_message
+from rag.streaming_callback import StreamingEvent
+
+class FakeWebSocket:
+    def __init__(self):
+        self.close_code = None
+
+    async def close(self, code: int = 1000):
+        self.close_code = code
+
+def _manager_with_queue(maxsize: int) -> ConnectionManager:
+    manager = ConnectionManager()
+    manager.active_connections["c"] = FakeWebSocket()
+    manager.connection_metadata["c"] = {"format": "json"}
+    manager.send_queues["c"] = asyncio.Queue(maxsize=maxsize)
+    return manager
+
+def _queued(manager: ConnectionManager):
+    queue = manager.send_queues["c"]
+    return [queue.get_nowait() for _ in range(queue.qsize())]
+
+def test_full_queue_drops_oldest_stream_event_only():
+    async def run():
+        manager = _manager_with_queue(3)
+        manager._enqueue("c", "query_received")
+        manager._enqueue("c", "token 1", batchable=True)
+        manager._enqueue("c", "token 2", batchable=True)
+        manager._enqueue("c", "complete")
+        return _queued(manager)
+    assert asyncio.run(run()) == [("query_received", False), ("token 2", True), ("complete", False)]
+
+def test_full_queue_drops_new_stream_event_when_nothing_else_is_droppable():
+    async def run():
+        manager = _manager_with_queue(2)
+        manager._enqueue("c", "query_received")
+        manager._enqueue("c", "agent_execution_start")
+        manager._enqueue("c", "token", batchable=True)
+        return _queued(manager)
+    assert asyncio.run(run()) == [("query_received", False), ("agent_execution_start", False)]
+
+def test_full_queue_of_control_messages_closes_connection():
+    async def run():
+        manager = _manager_with_queue(2)
+        websocket = manager.active_connections["c"]
+        manager._enqueue("c", "query_received")
+        manager._enqueue("c", "agent_execution_start")
+        manager._enqueue("c", "ready_for_next_query")
+        await asyncio.sleep(0)
+        return manager, websocket
+    manager, websocket = asyncio.run(run())
+    assert "c" not in manager.send_queues
+    assert websocket.close_code == 1013
+
+def test_encode_batch_msgpack_array_headers():
+    # 15 fits a fixarray header, 16 needs array 16 and 65536 needs array 32
+    for count in (1, 15, 16, 65535, 65536):
+        events = [{"type": "token", "i": i} for i in range(count)]
+        frame = encode_batch([encode_message(event, "msgpack") for event in events])
+        assert ormsgpack.unpackb(frame) == {"type": "batch", "events": events}
+
+def test_encode_batch_json():
+    events = [StreamingEvent(type="token", timestamp=1.5, metadata={"i": i}) for i in range(3)]
+    frame = encode_batch([encode_message(event, "json") for event in events])
+    assert orjson.loads(frame) == {"type": "batch", "events": [orjson.loads(orjson.dumps(event)) for event in events]}